@@ -0,0 +1,175 @@
+from json import dump, load
+from platform import machine, python_version, processor
+from timeit import Timer
+from numpy import linspace, pi, unique
+from numpy.random import default_rng
+
+######################################################################################################
+# BENCHMARK CASES ####################################################################################
+######################################################################################################
+
+# Each case is a function returning the callable to time, so that its setup is not timed. The cases
+# are scaled in the number of two-level systems and of time points, and run offline: the quantum ones
+# only use the local Aer simulator and the fake backends shipped with Qiskit.
+
+def synthetic_counts(spins: int, points: int, shots: int, seed: int = 0) -> list:
+    '''
+    Returns `points` counts dictionaries of `shots` random measurements of `spins` qubits.
+    '''
+    rng = default_rng(seed)
+    counts = []
+
+    for _ in range(points):
+        outcomes, values = unique(rng.integers(0, 2 ** spins, shots), return_counts = True)
+        counts.append({format(o, f'0{spins}b'): int(v) for o, v in zip(outcomes, values)})
+
+    return counts
+
+def classical_cases() -> dict:
+    '''
+    Returns the cases of `classical_simulator` and of the builders of its operators.
+    '''
+    from tools.classical_tools import classical_simulator, operator_sz, operator_sxx, cross_product, operator_x
+
+    def simulator(spins, points):
+        def run():
+            classical_simulator(linspace(0, 2 * pi, points), spins, 1 / spins)
+        return run
+
+    cases = {f'classical_simulator[n={n},t={t}]': simulator(n, t) for n in (4, 6, 8) for t in (100, 500)}
+    cases.update({f'operator_sz[n={n}]': (lambda n = n: lambda: operator_sz(n))() for n in (6, 8, 10)})
+    cases.update({f'operator_sxx[n={n}]': (lambda n = n: lambda: operator_sxx(n))() for n in (6, 8, 10)})
+    cases.update({f'cross_product[n={n}]': (lambda n = n: lambda: cross_product([operator_x] * n))() for n in (6, 8, 10)})
+
+    return cases
+
+def circuit_cases() -> dict:
+    '''
+    Returns the cases of the construction and of the transpilation of the trotter circuits.
+    '''
+    from qiskit import transpile
+    from qiskit.providers.fake_provider import FakeManila
+    from tools.quantum_tools import trotter_circuit, parametrized_circuits
+
+    device_backend = FakeManila()
+    cases = {}
+
+    for n in (3, 5):
+        cases[f'trotter_circuit[n={n},m=4]'] = (lambda n = n: lambda: trotter_circuit(n, 1., 4, 1 / n))()
+        cases[f'parametrized_circuits[n={n},m=4,t=50]'] = (lambda n = n: lambda: parametrized_circuits(linspace(0, 2 * pi, 50), n, 4, 1 / n))()
+        circuits = parametrized_circuits(linspace(0, 2 * pi, 10), n, 4, 1 / n)
+        cases[f'transpile[n={n},m=4,t=10]'] = (lambda circuits = circuits: lambda: transpile(circuits, device_backend, seed_transpiler = 0))()
+
+    return cases
+
+def counts_cases() -> dict:
+    '''
+    Returns the cases of the reducers of the counts, on synthetic counts.
+    '''
+    from tools.counts_tools import probability_and_internal_energy, measure_coupling_energy
+
+    cases = {}
+
+    for n in (4, 8, 12):
+        counts = synthetic_counts(n, 50, 3000)
+        times = linspace(0, 2 * pi, 50)
+        cases[f'probability_and_internal_energy[n={n},t=50]'] = (lambda counts = counts, n = n: lambda: probability_and_internal_energy(times, counts, n, 3000, True))()
+        cases[f'measure_coupling_energy[n={n},t=50]'] = (lambda counts = counts, n = n: lambda: measure_coupling_energy(times, counts, 1 / n, n, 3000))()
+
+    return cases
+
+def quantum_cases() -> dict:
+    '''
+    Returns the cases of a whole ideal `quantum_simulator` run on the local Aer simulator, including
+    the construction and the transpilation of the circuits, and of the same run with the transpiled
+    circuits already cached.
+    '''
+    from qiskit.providers.aer import QasmSimulator
+    from tools import quantum_tools
+    from tools.quantum_tools import quantum_simulator
+
+    backend = QasmSimulator()
+    quantum_tools.transpile_cache_dir = '' # Neither reading nor writing the QPY files of the user
+    cases = {}
+
+    def simulator(times, n, cached):
+        def run():
+            if not cached: # Timing the whole simulation, not the cache
+                quantum_tools.transpile_cache.clear()
+            quantum_simulator(times, n, 4, 1 / n, backend, backend, 1000)
+        return run
+
+    for n in (2, 4):
+        for points in (10, 50):
+            times = linspace(0, 2 * pi, points)
+            cases[f'quantum_simulator[n={n},m=4,t={points}]'] = simulator(times, n, False)
+            cases[f'quantum_simulator_cached[n={n},m=4,t={points}]'] = simulator(times, n, True)
+
+    return cases
+
+groups = {'classical': classical_cases, 'circuits': circuit_cases, 'counts': counts_cases, 'quantum': quantum_cases}
+
+######################################################################################################
+# RUNNING AND COMPARING ##############################################################################
+######################################################################################################
+
+def time_case(function: object, repeat: int = 5, budget: float = 0.2) -> float:
+    '''
+    Returns the best time, in seconds, of a single call of `function`, calling it enough times to
+    fill about `budget` seconds in each of the `repeat` measurements.
+    '''
+    timer = Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * budget / 0.2))
+
+    return min(timer.repeat(repeat, number)) / number
+
+def run_benchmarks(selected: list = None, pattern: str = '', repeat: int = 5) -> dict:
+    '''
+    Runs the cases of the `selected` groups (all of them by default) whose name contains `pattern`,
+    returning a dictionary with the machine description and the time of each case.
+    '''
+    results = {}
+
+    for group in selected or groups:
+        for name, function in groups[group]().items():
+            if pattern in name:
+                results[name] = time_case(function, repeat)
+                print(f'{name:<55} {results[name] * 1e3:12.4f} ms')
+
+    return {'machine': {'python': python_version(), 'machine': machine(), 'processor': processor()},
+            'results': results}
+
+def save_results(results: dict, file_name: str):
+    '''
+    Saves the `results` of `run_benchmarks` as JSON.
+    '''
+    with open(file_name, 'w') as file:
+        dump(results, file, indent = 2)
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.2) -> list:
+    '''
+    Returns the names of the cases present in both the `baseline` and the `current` results which
+    are slower by more than `threshold` (as a fraction of the baseline time), printing the ratios.
+    '''
+    regressions = []
+
+    for name, time in current['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        ratio = time / baseline['results'][name]
+        flag = ratio > 1 + threshold
+        print(f'{name:<55} {ratio:8.3f}x' + ('  REGRESSION' if flag else ''))
+
+        if flag:
+            regressions.append(name)
+
+    return regressions
+
+def load_results(file_name: str) -> dict:
+    '''
+    Loads results saved by `save_results`.
+    '''
+    with open(file_name) as file:
+        return load(file)
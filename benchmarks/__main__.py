@@ -0,0 +1,30 @@
+from argparse import ArgumentParser
+from sys import exit
+from . import groups, run_benchmarks, save_results, load_results, compare_results
+
+# Usage, from the root of the repository:
+#   python -m benchmarks run --output benchmarks/baseline.json
+#   python -m benchmarks run --output current.json --groups classical counts
+#   python -m benchmarks compare benchmarks/baseline.json current.json --threshold 0.2
+
+parser = ArgumentParser(prog = 'benchmarks', description = 'Benchmarks of the simulation hot paths.')
+commands = parser.add_subparsers(dest = 'command', required = True)
+
+run = commands.add_parser('run', help = 'run the benchmarks and save their times as JSON')
+run.add_argument('--output', default = 'benchmarks/baseline.json')
+run.add_argument('--groups', nargs = '*', choices = list(groups), default = None)
+run.add_argument('--filter', default = '', help = 'only run the cases whose name contains it')
+run.add_argument('--repeat', type = int, default = 5)
+
+compare = commands.add_parser('compare', help = 'compare two results, failing on regressions')
+compare.add_argument('baseline')
+compare.add_argument('current')
+compare.add_argument('--threshold', type = float, default = 0.2, help = 'tolerated slowdown fraction')
+
+arguments = parser.parse_args()
+
+if arguments.command == 'run':
+    save_results(run_benchmarks(arguments.groups, arguments.filter, arguments.repeat), arguments.output)
+else:
+    regressions = compare_results(load_results(arguments.baseline), load_results(arguments.current), arguments.threshold)
+    exit(1 if regressions else 0)
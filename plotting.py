@@ -1,15 +1,8 @@
-from plotly.graph_objects import Figure, Contour
-from tools.quantum_tools import trotter_circuit, quantum_simulator
 from tools.classical_tools import classical_simulator
-from tools.noise_tools import get_noise_model
-from numpy import pi, linspace, arange, array, zeros_like, divide
-from qiskit import transpile
-from qiskit import IBMQ
-from matplotlib.pyplot import title, show
-from qiskit.providers.aer import QasmSimulator
-from seaborn import heatmap
 from matplotlib.pyplot import plot, xlabel, ylabel, title, show, legend, ylim, text, subplots, figure, grid
-from matplotlib.lines import Line2D
+
+# Qiskit is imported by the functions running quantum simulations only, so that plotting the
+# classical ones does not load it.
     
 def info_string(n, m, g):
     return r'$n = $' + str(n) + ', ' + r'$m = $' + str(m) + ', ' + r'$g = $' + str(g)
@@ -44,31 +37,37 @@ def compare_probabilities(t, qt, p, qp, n, m, g):
     show()
     
 def compare_errors_4(times, quantum_times, i_nrg, n, m, g, shots, par, device_backend):
+    from qiskit.providers.aer import QasmSimulator
+    from tools.experiment_tools import run_experiments
+    from tools.noise_tools import get_noise_model
+
     fig, axs = subplots(2, 2, figsize = (8, 8))
 
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(*par[:5], n, par[-1]))
-    _, qi_nrg, _ = quantum_simulator(quantum_times, n, m, g, noisy_backend, device_backend, shots)
+    # The four noise models run concurrently on the same circuits
+    noises = {'all': par[:5], 'measurement': (par[0], 0, 0, 1, 1), 'depolarizing': (0, par[1], par[2], 1, 1),
+              'damping': (0, 0, 0, par[3], par[4])}
+    backends = {name: QasmSimulator(noise_model = get_noise_model(*noise, n, par[-1])) for name, noise in noises.items()}
+    results = run_experiments(quantum_times, n, m, g, backends, device_backend, shots)
+
+    _, qi_nrg, _ = results['all']['raw']
     axs[0, 0].plot(quantum_times, qi_nrg, 'y.')
     axs[0, 0].plot(times, i_nrg)
     axs[0, 0].set_title('All errors\n' + info_string(n, m, g))
     axs[0, 0].grid()
 
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(par[0], 0, 0, 1, 1, n, par[-1]))
-    _, qi_nrg, _ = quantum_simulator(quantum_times, n, m, g, noisy_backend, device_backend, shots)
+    _, qi_nrg, _ = results['measurement']['raw']
     axs[0, 1].plot(quantum_times, qi_nrg, 'g.')
     axs[0, 1].plot(times, i_nrg)
     axs[0, 1].set_title('Measurement error\n' + info_string(n, m, g))
     axs[0, 1].grid()
 
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(0, par[1], par[2], 1, 1, n, par[-1]))
-    _, qi_nrg, _ = quantum_simulator(quantum_times, n, m, g, noisy_backend, device_backend, shots)
+    _, qi_nrg, _ = results['depolarizing']['raw']
     axs[1, 0].plot(quantum_times, qi_nrg, 'r.')
     axs[1, 0].plot(times, i_nrg)
     axs[1, 0].set_title('Depolarizing error')
     axs[1, 0].grid()
 
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(0, 0, 0, par[3], par[4], n, par[-1]))
-    _, qi_nrg, _ = quantum_simulator(quantum_times, n, m, g, noisy_backend, device_backend, shots)
+    _, qi_nrg, _ = results['damping']['raw']
     axs[1, 1].plot(quantum_times, qi_nrg, 'm.')
     axs[1, 1].plot(times, i_nrg)
     axs[1, 1].set_title('Phase Amplitude Damping')
@@ -80,6 +79,10 @@ def compare_errors_4(times, quantum_times, i_nrg, n, m, g, shots, par, device_ba
     show()
     
 def compare_errors_2(times, quantum_times, n, m, g, shots, par, device_backend):
+    from qiskit.providers.aer import QasmSimulator
+    from tools.quantum_tools import quantum_simulator
+    from tools.noise_tools import get_noise_model
+
     fig, axs = subplots(1, 2, figsize = (10, 10))
 
     noisy_backend = QasmSimulator(noise_model = get_noise_model(*par[:5], n[0], par[-1]))
@@ -106,11 +109,17 @@ def compare_errors_2(times, quantum_times, n, m, g, shots, par, device_backend):
     show()
     
 def compare_errors_our_mit(times, quantum_times, n, m, g, shots, par, device_backend):
+    from qiskit.providers.aer import QasmSimulator
+    from tools.experiment_tools import run_experiments
+    from tools.noise_tools import get_noise_model
+
     fig, axs = subplots(1, 2, figsize = (11, 11))
     
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(*par[:5], n[0], par[-1]))
-    _, nqi_nrg, _ = quantum_simulator(quantum_times, n[0], m[0], g[0], noisy_backend, device_backend, shots)
-    _, mnqi_nrg, _ = quantum_simulator(quantum_times,n[0], m[0], g[0], noisy_backend, device_backend, shots, our_mitigation = True)
+    # The counts of a single run are processed with and without mitigation
+    noisy_backend = {'noisy': QasmSimulator(noise_model = get_noise_model(*par[:5], n[0], par[-1]))}
+    results = run_experiments(quantum_times, n[0], m[0], g[0], noisy_backend, device_backend, shots, ['raw', 'parity'])
+    _, nqi_nrg, _ = results['noisy']['raw']
+    _, mnqi_nrg, _ = results['noisy']['parity']
     _, i_nrg, _ = classical_simulator(times, n[0], g[0])
     axs[0].plot(quantum_times, nqi_nrg, 'y.')
     axs[0].plot(quantum_times, mnqi_nrg, 'g.')
@@ -120,9 +129,10 @@ def compare_errors_our_mit(times, quantum_times, n, m, g, shots, par, device_bac
     axs[0].set_ylabel(r'$E_{a}(t)$')
     axs[0].set_box_aspect(1)
 
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(*par[:5], n[1], par[-1]))
-    _, nqi_nrg, _ = quantum_simulator(quantum_times, n[1], m[1], g[1], noisy_backend, device_backend, shots)
-    _, mnqi_nrg, _ = quantum_simulator(quantum_times,n[1], m[1], g[1], noisy_backend, device_backend, shots, our_mitigation = True)
+    noisy_backend = {'noisy': QasmSimulator(noise_model = get_noise_model(*par[:5], n[1], par[-1]))}
+    results = run_experiments(quantum_times, n[1], m[1], g[1], noisy_backend, device_backend, shots, ['raw', 'parity'])
+    _, nqi_nrg, _ = results['noisy']['raw']
+    _, mnqi_nrg, _ = results['noisy']['parity']
     _, i_nrg, _ = classical_simulator(times, n[1], g[1])
     axs[1].plot(quantum_times, nqi_nrg, 'y.', label = 'Without mitigation')
     axs[1].plot(quantum_times, mnqi_nrg, 'g.', label = 'With mitigation')
@@ -138,11 +148,16 @@ def compare_errors_our_mit(times, quantum_times, n, m, g, shots, par, device_bac
     show()
     
 def compare_errors_mit(times, quantum_times, n, m, g, shots, par, device_backend):
+    from qiskit.providers.aer import QasmSimulator
+    from tools.experiment_tools import run_experiments
+    from tools.noise_tools import get_noise_model
+
     fig, axs = subplots(1, 2, figsize = (11, 11))
     
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(*par[:5], n[0], par[-1]))
-    _, nqi_nrg, _ = quantum_simulator(quantum_times, n[0], m[0], g[0], noisy_backend, device_backend, shots)
-    _, mnqi_nrg, _ = quantum_simulator(quantum_times,n[0], m[0], g[0], noisy_backend, device_backend, shots, measure_mitigation = True)
+    noisy_backend = {'noisy': QasmSimulator(noise_model = get_noise_model(*par[:5], n[0], par[-1]))}
+    results = run_experiments(quantum_times, n[0], m[0], g[0], noisy_backend, device_backend, shots, ['raw', 'measure'])
+    _, nqi_nrg, _ = results['noisy']['raw']
+    _, mnqi_nrg, _ = results['noisy']['measure']
     _, i_nrg, _ = classical_simulator(times, n[0], g[0])
     axs[0].plot(quantum_times, nqi_nrg, 'y.')
     axs[0].plot(quantum_times, mnqi_nrg, 'g.')
@@ -155,9 +170,10 @@ def compare_errors_mit(times, quantum_times, n, m, g, shots, par, device_backend
     axs[0].set_ylabel(r'$E_{a}(t)$')
     axs[0].set_box_aspect(1)
 
-    noisy_backend = QasmSimulator(noise_model = get_noise_model(*par[:5], n[1], par[-1]))
-    _, nqi_nrg, _ = quantum_simulator(quantum_times, n[1], m[1], g[1], noisy_backend, device_backend, shots)
-    _, mnqi_nrg, _ = quantum_simulator(quantum_times,n[1], m[1], g[1], noisy_backend, device_backend, shots, measure_mitigation = True)
+    noisy_backend = {'noisy': QasmSimulator(noise_model = get_noise_model(*par[:5], n[1], par[-1]))}
+    results = run_experiments(quantum_times, n[1], m[1], g[1], noisy_backend, device_backend, shots, ['raw', 'measure'])
+    _, nqi_nrg, _ = results['noisy']['raw']
+    _, mnqi_nrg, _ = results['noisy']['measure']
     _, i_nrg, _ = classical_simulator(times, n[1], g[1])
     axs[1].plot(quantum_times, nqi_nrg, 'y.', label = 'Without mitigation')
     axs[1].plot(quantum_times, mnqi_nrg, 'g.', label = 'With mitigation')
@@ -175,9 +191,13 @@ def compare_errors_mit(times, quantum_times, n, m, g, shots, par, device_backend
     
     show()
 
-from qiskit.visualization import plot_histogram
-
 def compare_histograms(n, m, g, t, parameters, shots, device_backend):
+    from qiskit import transpile
+    from qiskit.providers.aer import QasmSimulator
+    from qiskit.visualization import plot_histogram
+    from tools.quantum_tools import trotter_circuit
+    from tools.noise_tools import get_noise_model
+
     fig, axs = subplots(1, 2, figsize = (11, 11))
     noisy_backend = QasmSimulator(noise_model = get_noise_model(*parameters[:5], n[0], parameters[-1]))
     circuit = trotter_circuit(n[0], t[0], m[0], g[0])
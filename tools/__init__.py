@@ -1,5 +1,34 @@
-__all__ = ['classical_evolution', 'quantum_evolution']
+from importlib import import_module
 
-from .classical_tools import state_probability, cross_product, operator_sz, operator_single_sz, operator_single_sxx, operator_sxx, expectation_value, classical_simulator
-from .quantum_tools import get_circuit, trotter_circuit, probability_and_internal_energy, measure_coupling_energy, quantum_simulator, error_mitigation
-from .noise_tools import get_noise_model
\ No newline at end of file
+# The submodules are only imported on the first access to one of their names, so that the classical
+# simulations do not load Qiskit: `from tools import classical_simulator` only imports NumPy and SciPy.
+
+submodules = {
+    'profiling_tools': ['stage', 'collect_stats', 'dump_stats'],
+    'classical_tools': ['state_probability', 'cross_product', 'operator_sz', 'operator_single_sz', 'operator_single_sxx', 'operator_sxx', 'expectation_value', 'factorized_sxx', 'eigenbasis_evolution', 'dicke_hamiltonian', 'spin_operators', 'spectral_decomposition', 'clear_caches', 'lanczos_step', 'classical_stream', 'coupling_batch', 'classical_simulator', 'dicke_sz', 'dicke_sx', 'dicke_sxx', 'dicke_simulator'],
+    'quantum_tools': ['rxx_layer', 'get_circuit', 'trotter_circuit', 'parametric_templates', 'parametrized_circuits', 'transpiled_templates', 'transpiled_circuits', 'pauli_observables', 'exact_expectations', 'quantum_simulator', 'adaptive_simulator', 'error_mitigation', 'result_observables', 'data_from_job'],
+    'experiment_tools': ['run_experiments'],
+    'counts_tools': ['counts_to_arrays', 'dense_counts', 'hamming_weight', 'probability_and_internal_energy', 'measure_coupling_energy', 'standard_errors', 'parity_operator'],
+    'store_tools': ['load_index', 'find_records', 'append_record', 'load_record'],
+    'retrieval_tools': ['JobSpec', 'split_counts', 'grouped_job_counts', 'job_counts', 'job_observables', 'retrieve_jobs', 'StandInBackend'],
+    'trotter_tools': ['suzuki_step', 'trotter_layers', 'select_trotter_steps', 'trotter_error', 'exact_statevectors', 'trotter_statevectors', 'trotter_observables', 'sample_counts', 'trotter_simulator'],
+    'mitigation_tools': ['assignment_matrices', 'cached_calibration', 'dense_mitigation', 'subspace_mitigation', 'mitigate_counts'],
+    'lindblad_tools': ['noise_rates', 'lindblad_liouvillian', 'lindblad_simulator'],
+    'noise_tools': ['get_noise_model'],
+    'sweep_tools': ['SweepResult', 'maximal_power', 'engine_simulation', 'power_sweep', 'adaptive_sampling', 'maximal_power_search'],
+}
+
+exported = {name: module for module, names in submodules.items() for name in names}
+__all__ = list(exported)
+
+def __getattr__(name: str) -> object:
+    if name not in exported:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    value = getattr(import_module(f'.{exported[name]}', __name__), name)
+    globals()[name] = value # Later accesses do not go through here
+
+    return value
+
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,36 @@
+from hashlib import sha256
+
+def backend_key(device_backend: object) -> tuple:
+    '''
+    Returns a tuple identifying the configuration of `device_backend`, used as key of the caches.
+    '''
+    if hasattr(device_backend, 'configuration'):
+        config = device_backend.configuration()
+        properties = device_backend.properties() if hasattr(device_backend, 'properties') else None
+        calibration = str(properties.last_update_date) if properties else None
+        coupling_map = tuple(map(tuple, config.coupling_map or []))
+
+        return config.backend_name, config.backend_version, tuple(config.basis_gates), coupling_map, calibration
+
+    target = device_backend.target # Backends exposing a target only
+    coupling_map = target.build_coupling_map()
+    edges = tuple(sorted(coupling_map.get_edges())) if coupling_map else ()
+
+    return device_backend.name, str(device_backend.backend_version), tuple(sorted(target.operation_names)), edges
+
+def backend_name(backend: object) -> str:
+    '''
+    Returns the name of `backend`, a method of the V1 backends and an attribute of the V2 ones.
+    '''
+    name = backend.name
+
+    return name() if callable(name) else name
+
+def noise_key(backend: object) -> str:
+    '''
+    Returns a string identifying the noise model of a simulator `backend`, if any.
+    '''
+    options = getattr(backend, 'options', None)
+    noise_model = getattr(options, 'noise_model', None)
+
+    return sha256(repr(noise_model.to_dict()).encode()).hexdigest() if noise_model else None
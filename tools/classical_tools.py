@@ -1,46 +1,88 @@
-from numpy import kron, real, abs, array
+from numpy import kron, real, abs, array, exp, outer, asarray, sqrt, vdot, ndim
+from numpy.linalg import eigh as batched_eigh
 from itertools import combinations, product
-from numpy import linspace, zeros_like, zeros
-from scipy.linalg import expm
+from functools import lru_cache
+from .profiling_tools import stage
+from numpy import linspace, zeros_like, zeros, arange, full, concatenate, tile
+from scipy.linalg import expm, eigh, eigh_tridiagonal
+from scipy.sparse import kron as sparse_kron, csr_matrix, diags, identity
+from scipy.sparse.linalg import LinearOperator, aslinearoperator
 
 operator_i = array([[1, 0], [0, 1]], dtype = float) 
 operator_x = array([[0, 1], [1, 0]], dtype = float)
 operator_z = array([[1, 0], [0, -1]], dtype = float)
 
-def cross_product(operators: list) -> list:
+def cross_product(operators: list, sparse: bool = False) -> list:
     '''
     Given a list of matrices (operators) returns the cross product between all of them as another
-    matrix.
+    matrix, in CSR format if `sparse`.
     '''
-    product = kron(operators[0], operators[1]) # Cross product between the first two matrices
+    kron_product = (lambda a, b: sparse_kron(a, b, format = 'csr')) if sparse else kron
+    product = kron_product(operators[0], operators[1]) # Cross product between the first two matrices
 
     for operator in operators[2:]:
-        product = kron(product, operator) # Cross product between the remaining ones
+        product = kron_product(product, operator) # Cross product between the remaining ones
 
     return product
 
-def operator_single_sz(spins: int, index: int) -> list:
+def spin_bits(spins: int, index: int) -> list:
+    '''
+    Returns, for each element of the computational basis, the bit (0 for up, 1 for down) of the
+    `index` two-level system, with the first system being the most significant one.
+    '''
+    return (arange(2 ** spins) >> (spins - 1 - index)) & 1
+
+def flip_mask(spins: int, indices: list) -> int:
+    '''
+    Returns the integer whose set bits are those of the two-level systems in `indices`.
+    '''
+    mask = 0
+
+    for index in indices:
+        mask |= 1 << (spins - 1 - index)
+
+    return mask
+
+def bit_flip(spins: int, indices: list) -> list:
+    '''
+    Returns the permutation matrix, in CSR format, flipping the two-level systems in `indices`.
+    '''
+    rows = arange(2 ** spins)
+    columns = rows ^ flip_mask(spins, indices)
+
+    return csr_matrix((full(2 ** spins, 1.), (rows, columns)), shape = (2 ** spins, 2 ** spins))
+
+def operator_single_sz(spins: int, index: int, sparse: bool = False) -> list:
     '''
     Returns the spin angular momentum operator, represented as a matrix, along the z direction acting 
     on the `index` two-level system.
     '''
+    if sparse: # Diagonal in the computational basis
+        return diags(1 / 2 - spin_bits(spins, index), format = 'csr')
+
     single_sz = [operator_i if i != index else operator_z / 2 for i in range(spins)]
     return cross_product(single_sz)
 
-def operator_single_sxx(spins: int, first: int, second: int) -> list:
+def operator_single_sxx(spins: int, first: int, second: int, sparse: bool = False) -> list:
     '''
     Returns the spin angular momentum operator, represented as a matrix, along the x direction acting 
     on the `first` and `second` two-level systems.
     '''
+    if sparse: # Flips both systems
+        return bit_flip(spins, [first, second]) / 4
+
     single_sxx = [operator_i for _ in range(spins)] 
     single_sxx[first] = single_sxx[second] = operator_x / 2
 
     return cross_product(single_sxx)
 
-def operator_sz(spins: int) -> list:
+def operator_sz(spins: int, sparse: bool = False) -> list:
     '''
     Returns the total square spin angular momentum operator along the z direction as a matrix. 
     '''
+    if sparse: # Half the difference between the number of spins up and down
+        return diags(sum(1 / 2 - spin_bits(spins, i) for i in range(spins)), format = 'csr')
+
     sz = operator_single_sz(spins, 0)
     
     for i in range(1, spins):
@@ -48,10 +90,18 @@ def operator_sz(spins: int) -> list:
         
     return sz
 
-def operator_sxx(spins: int) -> list:
+def operator_sxx(spins: int, sparse: bool = False) -> list:
     '''
     Returns the total square spin angular momentum operator along the x direction as a matrix. 
     '''
+    if sparse: # Each pair flips two systems, so every row has one entry per pair
+        rows = arange(2 ** spins)
+        masks = [flip_mask(spins, pair) for pair in combinations(range(spins), 2)]
+        columns = concatenate([rows[:0]] + [rows ^ mask for mask in masks])
+        data = full(len(columns), 1 / 4)
+
+        return csr_matrix((data, (tile(rows, len(masks)), columns)), shape = (2 ** spins, 2 ** spins))
+
     sxx = 0
 
     for pair in combinations(range(spins), 2): # Cycling on the pairs without repetitions
@@ -59,24 +109,227 @@ def operator_sxx(spins: int) -> list:
 
     return sxx
 
+def factorized_sxx(spins: int) -> object:
+    '''
+    Returns the operator of `operator_sxx` as a linear operator applying (S_x^2 - n / 4) / 2 without
+    storing any matrix: S_x flips each two-level system in turn, that is it reverses the middle axis
+    of the state seen as a (2^i, 2, 2^(n - i - 1)) tensor.
+    '''
+    def apply_sx(psi):
+        sx_psi = zeros_like(psi)
+
+        for i in range(spins):
+            shape = (2 ** i, 2, -1)
+            sx_psi.reshape(shape)[...] += psi.reshape(shape)[:, ::-1]
+
+        return sx_psi / 2
+    
+    def matvec(psi):
+        return (apply_sx(apply_sx(psi)) - spins / 4 * psi) / 2
+
+    return LinearOperator((2 ** spins, 2 ** spins), matvec = matvec, matmat = matvec, 
+                          rmatvec = matvec, dtype = float)
+
 def expectation_value(psi: object, operator: list) -> float:
     '''
-    Returns the expected value of the observable `operator` computed on the state `psi`.
+    Returns the expected value of the observable `operator` computed on the state `psi`. If `psi` is
+    a matrix whose columns are states, or a stack of them, returns the expected value on each of them.
     '''
-    return real(psi.conjugate() @ operator @ psi)
+    return real((psi.conjugate() * (operator @ psi)).sum(axis = max(psi.ndim - 2, 0)))
 
 def state_probability(evolved_state: list, state: list) -> float:
     '''
-    Computes probability of observing the state `state` given the state of the system.
+    Computes probability of observing the state `state` given the state of the system. If
+    `evolved_state` is a matrix whose columns are states, returns the probability for each of them.
     '''
     return abs(state.conjugate() @ evolved_state) ** 2
 
-def classical_simulator(times: list, spins: int, coupling: float) -> (list, list, list):
+def eigenbasis_evolution(times: list, energies: list, eigenvectors: list, initial_state: list) -> list:
+    '''
+    Given the eigenvalues and the eigenvectors (as columns) of a Hamiltonian, returns the matrix whose
+    columns are the states evolved from `initial_state` at each of the `times`.
+    '''
+    coefficients = eigenvectors.T.conjugate() @ initial_state # Initial state in the eigenbasis
+    phases = exp(-1j * outer(energies, asarray(times, dtype = float))) # One column per time
+
+    return eigenvectors @ (coefficients[:, None] * phases)
+
+def dicke_hamiltonian(spins: int, coupling: float, sparse: bool = False, cache: bool = False) -> (object, object, object):
+    '''
+    Returns the free Hamiltonian, the interaction Hamiltonian and their sum. With `sparse` the first
+    is a diagonal CSR matrix and the other two are matrix-free linear operators, otherwise they are
+    built from the dense operators, taken from `spin_operators` with `cache`.
+    '''
+    if sparse:
+        H0 = operator_sz(spins, sparse = True)
+        H1 = -2 * coupling * factorized_sxx(spins)
+        return H0, H1, aslinearoperator(H0) + H1
+
+    H0, sxx = spin_operators(spins) if cache else (operator_sz(spins), operator_sxx(spins))
+    H1 = -2 * coupling * sxx
+    return H0, H1, H0 + H1
+
+def read_only(*arrays: list) -> tuple:
+    '''
+    Marks the `arrays` as read-only, so that the ones shared by a cache cannot be modified.
+    '''
+    for matrix in arrays:
+        matrix.setflags(write = False)
+
+    return arrays
+
+@lru_cache(maxsize = 8)
+def spin_operators(spins: int) -> (list, list):
+    '''
+    Returns the dense `operator_sz` and `operator_sxx`, which do not depend on the coupling, caching
+    the ones of the most recently used numbers of two-level systems. The simulators only use it, and
+    `spectral_decomposition`, with `cache`, as the cached matrices stay in memory until `clear_caches`.
+    '''
+    return read_only(operator_sz(spins), operator_sxx(spins))
+
+@lru_cache(maxsize = 4)
+def spectral_decomposition(spins: int, coupling: float) -> (list, list):
+    '''
+    Returns the eigenvalues and the eigenvectors (as columns) of the dense Dicke Hamiltonian, caching
+    the ones of the most recently used parameters.
+    '''
+    return read_only(*eigh(dicke_hamiltonian(spins, coupling, cache = True)[2]))
+
+def clear_caches():
+    '''
+    Frees the matrices kept by `spin_operators` and `spectral_decomposition`.
+    '''
+    spin_operators.cache_clear()
+    spectral_decomposition.cache_clear()
+
+def lanczos_step(hamiltonian: object, state: list, time_step: float, krylov_dimension: int = 20, 
+                 tolerance: float = 1e-12) -> list:
+    '''
+    Returns `state` evolved for `time_step` by the Hermitian `hamiltonian`, approximating the action
+    of the propagator in the Krylov subspace built by Lanczos iterations until the estimated error
+    is below `tolerance`. If that needs more than `krylov_dimension` iterations the step is split in
+    two halves.
+    '''
+    norm = sqrt(real(vdot(state, state)))
+    basis = [state / norm]
+    alphas, betas = [], []
+
+    for j in range(krylov_dimension):
+        w = hamiltonian @ basis[j]
+        alphas.append(real(vdot(basis[j], w)))
+
+        for vector in basis: # Full reorthogonalization, the subspace is small
+            w = w - vdot(vector, w) * vector
+
+        betas.append(sqrt(real(vdot(w, w))))
+        energies, eigenvectors = eigh_tridiagonal(alphas, betas[:-1])
+        coefficients = eigenvectors @ (exp(-1j * energies * time_step) * eigenvectors[0])
+
+        if betas[-1] * abs(coefficients[-1]) <= tolerance: # Size of the component leaking out
+            return norm * sum(coefficient * vector for coefficient, vector in zip(coefficients, basis))
+
+        basis.append(w / betas[-1])
+
+    half = lanczos_step(hamiltonian, state, time_step / 2, krylov_dimension, tolerance)
+    return lanczos_step(hamiltonian, half, time_step / 2, krylov_dimension, tolerance)
+
+def classical_stream(times: list, spins: int, coupling: float, sparse: bool = True) -> object:
+    '''
+    Generator yielding `(t, probability, internal_energy, coupling_energy)` for each of the `times`,
+    in order. The state is stepped from one time to the next applying only the action of the
+    propagator, so neither the propagator nor the whole datasets are ever stored.
+    '''
+    with stage('operator_build'):
+        H0, H1, hamiltonian = dicke_hamiltonian(spins, coupling, sparse)
+
+    # Initial state definition
+    evolved_state = zeros(2 ** spins, dtype = complex)
+    evolved_state[-1] = 1
+    previous = 0
+
+    for t in times:
+        if t != previous:
+            with stage('propagation'):
+                evolved_state = lanczos_step(hamiltonian, evolved_state, t - previous)
+
+            previous = t
+
+        probability = abs(evolved_state[0]) ** 2 # The first state has all spins up
+        internal_energy = expectation_value(evolved_state, H0) / spins + 1 / 2
+        coupling_energy = expectation_value(evolved_state, H1) / spins
+
+        yield t, probability, internal_energy, coupling_energy
+
+def coupling_batch(times: list, spins: int, couplings: list, method: str = None, sparse: bool = False,
+                   cache: bool = False) -> (list, list, list):
+    '''
+    Same as `classical_simulator` for each of the `couplings`, returning matrices with one row per
+    coupling and one column per time. With the spectral method the Hamiltonians of all the couplings
+    share the same operators, from `spin_operators` with `cache`, and are diagonalized and evolved
+    together.
+    '''
+    couplings = asarray(couplings, dtype = float)
+    method = method or ('krylov' if sparse else 'spectral')
+
+    if method != 'spectral':
+        results = [classical_simulator(times, spins, coupling, method, sparse, cache) for coupling in couplings]
+        return tuple(array(observable) for observable in zip(*results))
+
+    with stage('operator_build'):
+        sz, sxx = spin_operators(spins) if cache else (operator_sz(spins), operator_sxx(spins))
+
+    with stage('diagonalization'):
+        energies, eigenvectors = batched_eigh(sz + (-2 * couplings)[:, None, None] * sxx)
+
+    with stage('propagation'):
+        # The initial state, with all spins down, is the last of the basis
+        phases = exp(-1j * energies[:, :, None] * asarray(times, dtype = float)) # One column per time
+        evolved_states = eigenvectors @ (eigenvectors[:, -1, :, None] * phases)
+
+    with stage('observables'):
+        populations = abs(evolved_states) ** 2
+        probabilities = populations[:, 0]
+        internal_energy = (sz.diagonal()[:, None] * populations).sum(axis = 1) / spins + 1 / 2 # Diagonal S_z
+        coupling_energy = -2 * couplings[:, None] * expectation_value(evolved_states, sxx) / spins
+
+    return probabilities, internal_energy, coupling_energy
+
+def classical_simulator(times: list, spins: int, coupling: float, method: str = None, sparse: bool = False,
+                        cache: bool = False) -> (list, list, list):
     '''
     Given a time discretization, the number of two-level systems and the parameters of the Dicke 
     system, simulates the evolution of the system and calculate the average value of the observables
-    of interest at each time step. 
+    of interest at each time step. With `method = 'spectral'` the Hamiltonian is diagonalized once
+    and all the times are evaluated together, with `method = 'expm'` the propagator is computed
+    separately at each time and with `method = 'krylov'` the state is stepped from one time to the
+    next as in `classical_stream`. With `sparse` the operators are never stored as dense matrices.
+    With `cache` the dense operators and the spectral decomposition are taken from `spin_operators`
+    and `spectral_decomposition`, which keep them for later calls, as in the sweeps, otherwise they
+    are freed on return. With an array of couplings, the observables are matrices with one row per coupling, computed by
+    `coupling_batch`.
     '''
+    method = method or ('krylov' if sparse else 'spectral')
+
+    if method not in ('spectral', 'expm', 'krylov'):
+        raise ValueError(f"Unknown method '{method}', expected 'spectral', 'expm' or 'krylov'")
+
+    if sparse and method != 'krylov':
+        raise ValueError(f"The method '{method}' needs dense operators, sparse = True only supports method = 'krylov'")
+
+    if ndim(coupling) > 0:
+        return coupling_batch(times, spins, coupling, method, sparse, cache)
+
+    # Datasets containing the measures
+    probabilities = zeros_like(times, dtype = float)
+    internal_energy = zeros_like(times, dtype = float)
+    coupling_energy = zeros_like(times, dtype = float)
+
+    if method == 'krylov':
+        for i, (_, *observables) in enumerate(classical_stream(times, spins, coupling, sparse)):
+            probabilities[i], internal_energy[i], coupling_energy[i] = observables
+
+        return probabilities, internal_energy, coupling_energy
+
     # Initial state definition
     initial_state = zeros(2 ** spins, dtype = float)
     initial_state[-1] = 1
@@ -85,21 +338,97 @@ def classical_simulator(times: list, spins: int, coupling: float) -> (list, list
     state_up = zeros(2 ** spins, dtype = float)
     state_up[0] = 1
 
-    # Dicke Hamiltonian 
-    H0 = operator_sz(spins)
-    H1 = -2 * coupling * operator_sxx(spins)
-    hamiltonian = H0 + H1
+    # Dicke Hamiltonian, whose sum is only built when needed
+    with stage('operator_build'):
+        H0, sxx = spin_operators(spins) if cache else (operator_sz(spins), operator_sxx(spins))
+        H1 = -2 * coupling * sxx
 
-    # Datasets containing the measures
-    probabilities = zeros_like(times, dtype = float)
-    internal_energy = zeros_like(times, dtype = float)
-    coupling_energy = zeros_like(times, dtype = float)
+    if method == 'spectral':
+        with stage('diagonalization'):
+            decomposition = spectral_decomposition(spins, coupling) if cache else eigh(H0 + H1)
+
+        with stage('propagation'):
+            evolved_states = eigenbasis_evolution(times, *decomposition, initial_state)
+
+        with stage('observables'):
+            probabilities = state_probability(evolved_states, state_up)
+            internal_energy = expectation_value(evolved_states, H0) / spins + 1 / 2
+            coupling_energy = expectation_value(evolved_states, H1) / spins
+
+        return probabilities, internal_energy, coupling_energy
     
+    hamiltonian = H0 + H1
+
     # Simulations
     for i, t in enumerate(times):
-        evolved_state = expm(-1j * hamiltonian * t) @ initial_state
+        with stage('expm'):
+            evolved_state = expm(-1j * hamiltonian * t) @ initial_state
+
         probabilities[i] = state_probability(evolved_state, state_up)
         internal_energy[i] = expectation_value(evolved_state, H0) / spins + 1 / 2
         coupling_energy[i] = expectation_value(evolved_state, H1) / spins
         
-    return probabilities, internal_energy, coupling_energy
\ No newline at end of file
+    return probabilities, internal_energy, coupling_energy
+
+######################################################################################################
+# COLLECTIVE SPIN (DICKE) BASIS ######################################################################
+######################################################################################################
+
+def dicke_sz(spins: int) -> list:
+    '''
+    Returns the total spin angular momentum operator along the z direction in the basis of the
+    maximal total spin J = n / 2 multiplet, as a CSR matrix. The `k` element of the basis has
+    S_z = J - k, so the first one has all spins up and the last one all spins down.
+    '''
+    return diags(spins / 2 - arange(spins + 1), format = 'csr')
+
+def dicke_sx(spins: int) -> list:
+    '''
+    Returns the total spin angular momentum operator along the x direction in the basis of the
+    maximal total spin multiplet, as a tridiagonal CSR matrix.
+    '''
+    j = spins / 2
+    m = j - arange(spins) # Raising from J - k - 1 to J - k
+    ladder = sqrt(j * (j + 1) - m * (m - 1)) / 2
+
+    return diags([ladder, ladder], [1, -1], format = 'csr')
+
+def dicke_sxx(spins: int) -> list:
+    '''
+    Returns the operator of `operator_sxx`, that is (S_x^2 - n / 4) / 2, in the basis of the maximal
+    total spin multiplet, as a pentadiagonal CSR matrix.
+    '''
+    sx = dicke_sx(spins)
+
+    return ((sx @ sx - spins / 4 * identity(spins + 1, format = 'csr')) / 2).tocsr()
+
+def dicke_simulator(times: list, spins: int, coupling: float) -> (list, list, list):
+    '''
+    Same as `classical_simulator`, but the evolution from the state with all spins down is computed
+    in the n + 1 dimensional maximal total spin multiplet it never leaves. The Hamiltonian only
+    couples states whose S_z differ by an even number, so it is diagonalized as a tridiagonal matrix
+    on the states with the same parity as the initial one.
+    '''
+    block = arange(spins % 2, spins + 1, 2) # Same parity of the state with all spins down
+
+    # Dicke Hamiltonian restricted to the block
+    H0 = dicke_sz(spins)[block][:, block]
+    H1 = -2 * coupling * dicke_sxx(spins)[block][:, block]
+    hamiltonian = H0 + H1
+
+    initial_state = zeros(len(block), dtype = float)
+    initial_state[-1] = 1
+
+    energies, eigenvectors = eigh_tridiagonal(hamiltonian.diagonal(), hamiltonian.diagonal(1))
+    evolved_states = eigenbasis_evolution(times, energies, eigenvectors, initial_state)
+
+    # The state with all spins up is in the block only for an even number of spins
+    if spins % 2 == 0:
+        probabilities = abs(evolved_states[0]) ** 2
+    else:
+        probabilities = zeros_like(times, dtype = float)
+
+    internal_energy = expectation_value(evolved_states, H0) / spins + 1 / 2
+    coupling_energy = expectation_value(evolved_states, H1) / spins
+
+    return probabilities, internal_energy, coupling_energy
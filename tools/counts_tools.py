@@ -0,0 +1,119 @@
+from numpy import array, isclose, pi, exp, zeros, full, concatenate, bincount, ndarray, sqrt, maximum
+
+######################################################################################################
+# USING THE OBTAINED COUNTS TO FIND THE AVERAGES ENERGIES ############################################
+######################################################################################################
+
+def counts_to_arrays(counts: list) -> (list, list, list):
+    '''
+    Converts a list of counts dictionaries, or the dense counts of `dense_counts`, into three flat
+    arrays: the index of the dictionary, the measured binary sequence as an integer and its count.
+    '''
+    if isinstance(counts, ndarray): # Dense counts, one row per dictionary
+        index, outcomes = counts.nonzero()
+        return index, outcomes, counts[index, outcomes].astype(float)
+
+    index = concatenate([full(len(count), i) for i, count in enumerate(counts)] + [zeros(0, dtype = int)])
+    outcomes = array([int(state, 2) for count in counts for state in count], dtype = int)
+    values = array([value for count in counts for value in count.values()], dtype = float)
+
+    return index, outcomes, values
+
+def dense_counts(counts: list, spins: int) -> list:
+    '''
+    Converts a list of counts dictionaries into a matrix with one row per dictionary and one column
+    per binary sequence, as an integer. The counts are stored as integers unless some of them are not,
+    as for the mitigated ones.
+    '''
+    index, outcomes, values = counts_to_arrays(counts)
+    integer = (values == values.round()).all()
+    dense = zeros((len(counts), 2 ** spins), dtype = int if integer else float)
+    dense[index, outcomes] = values
+
+    return dense
+
+def hamming_weight(outcomes: list, spins: int) -> list:
+    '''
+    Returns the number of ones, that is of spins down, in each of the binary sequences `outcomes`.
+    '''
+    return sum((outcomes >> i) & 1 for i in range(spins))
+
+def measure_coupling_energy(quantum_times: list, counts: list, coupling: float, spins: int, shots: int) -> list:
+    '''
+    Counts the results obtained from the quantum simulation to compute the average coupling energy,
+    that is the expectation value of the square total spin angular momentum along the x direction
+    '''
+    index, outcomes, values = counts_to_arrays(counts)
+    down = hamming_weight(outcomes, spins)
+
+    # Pairs of different characters count +1, pairs of equal ones -1
+    pairs = spins * (spins - 1) / 2
+    coefficents = 2 * down * (spins - down) - pairs
+    quantum_coupling_energy = bincount(index, coefficents * values, len(quantum_times))
+        
+    return quantum_coupling_energy * (coupling / spins / shots / 2)
+
+def probability_and_internal_energy(quantum_times: list, counts: list, spins: int, shots: int, our_mitigation: bool) -> (list, list):
+    '''
+    Counts the results obtained from the quantum simulation to compute the average internal energy,
+    that is the expectation value of the total spin angular momentum along the z direction
+    '''
+    index, outcomes, values = counts_to_arrays(counts)
+    total_spin = spins / 2 - hamming_weight(outcomes, spins)
+    
+    # Counting to compute the probability of all spins up
+    quantum_probabilities = bincount(index, values * (outcomes == 0), len(quantum_times)) / shots
+
+    if our_mitigation: # Parity must conserve
+        values = values * isclose(parity_operator(total_spin), parity_operator(- spins / 2))
+        factor = bincount(index, values, len(quantum_times))
+    else:
+        factor = shots
+        
+    quantum_internal_energy = bincount(index, total_spin * values, len(quantum_times))
+    quantum_internal_energy = quantum_internal_energy / (spins * factor) + 1 / 2
+        
+    return quantum_probabilities, quantum_internal_energy
+    
+def standard_errors(quantum_times: list, first_counts: list, second_counts: list, coupling: float, spins: int,
+                    shots: list, our_mitigation: bool) -> (list, list, list):
+    '''
+    Returns the standard errors of the probability of all spins up, of the average internal energy
+    and of the average coupling energy computed from the counts along z and along x, given the
+    number of `shots` of each time, as the sample standard deviations over the square root of the
+    number of shots. The probability is estimated as (k + 1) / (shots + 2), so that its error does
+    not vanish when all spins up is never or always measured.
+    '''
+    times = len(quantum_times)
+    index, outcomes, values = counts_to_arrays(first_counts)
+    total_spin = spins / 2 - hamming_weight(outcomes, spins)
+
+    probability = (bincount(index, values * (outcomes == 0), times) + 1) / (shots + 2)
+    probability_error = sqrt(probability * (1 - probability) / shots)
+
+    if our_mitigation: # Only the shots with the right parity are kept
+        values = values * isclose(parity_operator(total_spin), parity_operator(- spins / 2))
+        kept = maximum(bincount(index, values, times), 1)
+    else:
+        kept = shots
+
+    mean = bincount(index, total_spin * values, times) / kept
+    variance = bincount(index, total_spin ** 2 * values, times) / kept - mean ** 2
+    internal_error = sqrt(maximum(variance, 0) / kept) / spins
+
+    index, outcomes, values = counts_to_arrays(second_counts)
+    down = hamming_weight(outcomes, spins)
+    coefficents = 2 * down * (spins - down) - spins * (spins - 1) / 2
+    mean = bincount(index, coefficents * values, times) / shots
+    variance = bincount(index, coefficents ** 2 * values, times) / shots - mean ** 2
+    coupling_error = sqrt(maximum(variance, 0) / shots) * abs(coupling) / spins / 2
+
+    return probability_error, internal_error, coupling_error
+
+def parity_operator(total_spin: float) -> float:
+    '''
+    Returns the value take by the parity operator
+    '''
+    exponent = (pi * total_spin) % (2 * pi)
+    
+    return exp(1j * exponent)
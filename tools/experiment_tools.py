@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from .quantum_tools import transpiled_circuits, result_observables
+from .profiling_tools import stage
+
+######################################################################################################
+# SEVERAL BACKENDS AND MITIGATIONS ON THE SAME CIRCUITS ##############################################
+######################################################################################################
+
+# Post processing options of `run_experiments`, as the mitigation arguments of `quantum_simulator`
+processings = {
+    'raw': {},
+    'parity': {'our_mitigation': True},
+    'measure': {'measure_mitigation': True},
+}
+
+def run_experiments(times: list, spins: int, trotter_steps: int, coupling: float, backends: dict, device_backend: object,
+                    shots: int, options: list = ('raw',), workers: int = None, order: int = 1,
+                    swap_network: bool = False) -> dict:
+    '''
+    Runs the circuits of `quantum_simulator`, transpiled for `device_backend` and bound only once, on
+    each of the `backends` (a dictionary of backends by name) concurrently on a pool of `workers`
+    threads (one per backend by default). The counts of each backend are then processed with each of
+    the `options`, names of `processings` or dictionaries of mitigation arguments, without running
+    them again. Returns `{backend name: {option: (probabilities, internal energy, coupling energy)}}`,
+    where the options given as dictionaries are named by their position. The circuits use the
+    product formula of `order`, with the RXX gates along a swap network if `swap_network`.
+    '''
+    options = {option if isinstance(option, str) else i: processings[option] if isinstance(option, str) else option
+               for i, option in enumerate(options)}
+    circuits = transpiled_circuits(times, spins, trotter_steps, coupling, device_backend, order, swap_network)
+
+    def run(backend):
+        with stage('backend.run'):
+            return backend.run(circuits, shots = shots).result()
+
+    with ThreadPoolExecutor(workers or len(backends)) as executor:
+        results = dict(zip(backends, executor.map(run, backends.values())))
+
+    return {name: {option: result_observables(times, results[name], spins, coupling, backends[name], shots, **arguments)
+                   for option, arguments in options.items()}
+            for name in backends}
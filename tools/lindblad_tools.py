@@ -0,0 +1,187 @@
+from numpy import array, arange, eye, kron, zeros, full, exp, log, sqrt, real, asarray, concatenate
+from scipy.sparse import csr_matrix, identity
+from scipy.sparse.linalg import expm_multiply
+from scipy.special import gammaln
+
+operator_x = array([[0, 1], [1, 0]], dtype = complex)
+operator_y = array([[0, -1j], [1j, 0]], dtype = complex)
+operator_z = array([[1, 0], [0, -1]], dtype = complex)
+lowering = array([[0, 0], [1, 0]], dtype = complex) # From 0 to 1, towards the ground state of S_z
+
+######################################################################################################
+# PERMUTATION SYMMETRIC REPRESENTATION OF THE DENSITY MATRIX #########################################
+######################################################################################################
+
+# The density matrix of each two-level system is a vector in the basis of the matrix units |0><0|,
+# |0><1|, |1><0| and |1><1|, so that `vec(A ρ B) = kron(A, B.T) @ vec(ρ)`. The density matrix of
+# n systems which is invariant under permutations lives in the symmetric subspace of n copies of
+# these vectors, whose orthonormal basis is given by the occupation numbers of the four matrix units.
+
+def occupation_basis(spins: int) -> (list, list):
+    '''
+    Returns the array of the occupation numbers of the four matrix units, one row per element of the
+    basis, and the array mapping the first three occupation numbers to the index of the element.
+    '''
+    occupations = array([(a, b, c, spins - a - b - c) for a in range(spins + 1)
+                         for b in range(spins + 1 - a) for c in range(spins + 1 - a - b)])
+    index = full((spins + 1,) * 3, -1)
+    index[occupations[:, 0], occupations[:, 1], occupations[:, 2]] = arange(len(occupations))
+
+    return occupations, index
+
+def one_body(superoperator: list, occupations: list, index: list) -> object:
+    '''
+    Returns, as a CSR matrix in the occupation basis, the sum over the two-level systems of the 4 x 4
+    `superoperator` acting on each of them.
+    '''
+    rows, columns, elements = [], [], []
+
+    for a in range(4):
+        for b in range(4):
+            if superoperator[a, b] == 0:
+                continue
+
+            source = occupations[:, b] > 0
+            target = occupations[source].copy()
+            target[:, b] -= 1
+            target[:, a] += 1
+            amplitude = sqrt(occupations[source, b] * target[:, a])
+
+            rows.append(index[target[:, 0], target[:, 1], target[:, 2]])
+            columns.append(source.nonzero()[0])
+            elements.append(superoperator[a, b] * amplitude)
+
+    size = len(occupations)
+
+    if not elements: # Null superoperator
+        return csr_matrix((size, size), dtype = complex)
+
+    return csr_matrix((concatenate(elements), (concatenate(rows), concatenate(columns))), shape = (size, size))
+
+def product_vector(site: list, occupations: list) -> list:
+    '''
+    Returns, in the occupation basis, the tensor product of n copies of the 4 dimensional `site`
+    vector.
+    '''
+    spins = occupations[0].sum()
+    vector = zeros(len(occupations), dtype = complex)
+
+    # Only the matrix units with a non-zero component can be occupied
+    allowed = (occupations[:, asarray(site) == 0] == 0).all(axis = 1)
+    allowed_occupations = occupations[allowed]
+    multinomial = gammaln(spins + 1) - gammaln(allowed_occupations + 1).sum(axis = 1)
+    amplitude = exp(multinomial / 2)
+
+    for unit in range(4):
+        if site[unit] != 0:
+            amplitude = amplitude * asarray(site[unit], dtype = complex) ** allowed_occupations[:, unit]
+
+    vector[allowed] = amplitude
+
+    return vector
+
+def left(operator: list) -> list:
+    '''
+    Returns the superoperator multiplying a single two-level system density matrix on the left.
+    '''
+    return kron(operator, eye(2))
+
+def right(operator: list) -> list:
+    '''
+    Returns the superoperator multiplying a single two-level system density matrix on the right.
+    '''
+    return kron(eye(2), operator.T)
+
+def dissipator(jump: list) -> list:
+    '''
+    Returns the superoperator of the Lindblad dissipator of the `jump` operator.
+    '''
+    decay = jump.conjugate().T @ jump
+
+    return kron(jump, jump.conjugate()) - (left(decay) + right(decay)) / 2
+
+######################################################################################################
+# NOISY EVOLUTION ####################################################################################
+######################################################################################################
+
+def noise_rates(p_dep: float, p_cnot: float, t1: float, t2: float, time_gate: float) -> (float, float, float):
+    '''
+    Converts the parameters of `get_noise_model` into the rates, per unit of physical time, of
+    amplitude damping towards 1, pure dephasing and depolarization of each two-level system. The
+    damping and the dephasing give the decay times `t1` and `t2`, while the single and two qubits
+    gate depolarizations are assumed to act continuously during each gate time.
+    '''
+    damping = 1 / t1
+    dephasing = max(1 / t2 - 1 / (2 * t1), 0) # Decay rate of the coherences not due to damping
+    depolarization = - (log(1 - p_dep) + log(1 - p_cnot)) / time_gate
+
+    return damping, dephasing, depolarization
+
+def lindblad_liouvillian(spins: int, coupling: float, damping: float, dephasing: float, depolarization: float) -> (object, list, list):
+    '''
+    Returns, as a CSR matrix in the occupation basis, the Liouvillian of the Dicke Hamiltonian with
+    local damping, dephasing and depolarization at the given rates (per unit of ω_z t), together with
+    the occupation basis and its index.
+    '''
+    occupations, index = occupation_basis(spins)
+
+    def pairs(superoperator): # Sum over the pairs of the products of `superoperator` on each
+        single = one_body(superoperator, occupations, index)
+        square = one_body(superoperator @ superoperator, occupations, index)
+        return (single @ single - square) / 2
+
+    # Commutator with H = S_z - 2g sum over the pairs of S_x S_x
+    sz = operator_z / 2
+    sx = operator_x / 2
+    liouvillian = -1j * one_body(left(sz) - right(sz), occupations, index)
+    liouvillian += 2j * coupling * (pairs(left(sx)) - pairs(right(sx)))
+
+    # Local dissipation
+    local = damping * dissipator(lowering) + dephasing / 2 * dissipator(operator_z)
+    local += depolarization / 4 * sum(dissipator(pauli) for pauli in (operator_x, operator_y, operator_z))
+    liouvillian += one_body(local, occupations, index)
+
+    return liouvillian.tocsr(), occupations, index
+
+def lindblad_simulator(times: list, spins: int, coupling: float, p_meas: float, p_dep: float, p_cnot: float,
+                       t1: float, t2: float, time_gate: float, time_unit: float = None) -> (list, list, list):
+    '''
+    Deterministic continuous-time noisy model: integrates the master equation of the Dicke
+    Hamiltonian with the local noise of `noise_rates`, taken from the parameters of
+    `get_noise_model`, in the permutation symmetric representation, whose dimension grows as n^3 / 6,
+    and returns the probability of all spins up, the average internal energy and the average
+    coupling energy as measured with readout error `p_meas`. One unit of ω_z t lasts `time_unit`
+    (by default `time_gate`). The noise acts continuously instead of after each transpiled gate of
+    the trotterized circuits, whose number grows with the time, so this does not reproduce the Aer
+    simulations with `get_noise_model` nor the panels of `compare_noisy`.
+    '''
+    time_unit = time_unit or time_gate
+    rates = [rate * time_unit for rate in noise_rates(p_dep, p_cnot, t1, t2, time_gate)]
+    liouvillian, occupations, index = lindblad_liouvillian(spins, coupling, *rates)
+
+    # Initial state with all spins down and identity to compute the traces
+    state = product_vector([0, 0, 0, 1], occupations)
+    trace = product_vector([1, 0, 0, 1], occupations)
+
+    # Observables as measured with readout errors
+    readout = 1 - 2 * p_meas
+    all_up = product_vector([1 - p_meas, 0, 0, p_meas], occupations)
+    sz = one_body(left(operator_z / 2), occupations, index).T @ trace * readout
+    sx = one_body(left(operator_x), occupations, index)
+    pairs = (sx @ sx - spins * identity(len(occupations))).T @ trace / 2 * readout ** 2
+
+    probabilities = zeros(len(times))
+    internal_energy = zeros(len(times))
+    coupling_energy = zeros(len(times))
+    previous = 0
+
+    for i, t in enumerate(times):
+        if t != previous:
+            state = expm_multiply(liouvillian * (t - previous), state)
+            previous = t
+
+        probabilities[i] = real(all_up @ state)
+        internal_energy[i] = real(sz @ state) / spins + 1 / 2
+        coupling_energy[i] = - coupling * real(pairs @ state) / spins / 2
+
+    return probabilities, internal_energy, coupling_energy
@@ -0,0 +1,126 @@
+from qiskit import QuantumCircuit, transpile
+from numpy import array, asarray, zeros, moveaxis, tensordot, prod, concatenate
+from numpy.linalg import inv
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.linalg import gmres
+from time import time as now
+from .backend_tools import backend_key, noise_key
+
+######################################################################################################
+# TENSORED CALIBRATION ###############################################################################
+######################################################################################################
+
+calibration_cache = {}
+
+def calibration_circuits(spins: int) -> list:
+    '''
+    Returns the two calibration circuits preparing all the qubits in 0 and all of them in 1.
+    '''
+    zero, one = QuantumCircuit(spins), QuantumCircuit(spins)
+    one.x(range(spins))
+    zero.measure_all()
+    one.measure_all()
+
+    return [zero, one]
+
+def assignment_matrices(backend: object, spins: int, shots: int, layout: list = None) -> list:
+    '''
+    Runs the calibration circuits and returns, for each qubit, the 2 x 2 matrix whose element (i, j)
+    is the probability of measuring i having prepared j, assuming the readout errors of different
+    qubits to be independent.
+    '''
+    circuits = transpile(calibration_circuits(spins), backend, initial_layout = layout)
+    counts = backend.run(circuits, shots = shots).result().get_counts()
+    matrices = zeros((spins, 2, 2))
+
+    for prepared, count in enumerate(counts):
+        for state, value in count.items():
+            for qubit in range(spins): # Qubit `q` is the character `spins - 1 - q`
+                matrices[qubit, int(state[spins - 1 - qubit]), prepared] += value
+
+    return matrices / shots
+
+def cached_calibration(backend: object, spins: int, shots: int, layout: list = None,
+                       max_age: float = 3600) -> list:
+    '''
+    Same as `assignment_matrices`, but the calibrations are cached by backend, noise model and
+    qubit layout, and reused if not older than `max_age` seconds.
+    '''
+    layout = tuple(layout) if layout is not None else tuple(range(spins))
+    key = (backend_key(backend), noise_key(backend), layout)
+
+    if key in calibration_cache:
+        timestamp, matrices = calibration_cache[key]
+
+        if now() - timestamp <= max_age:
+            return matrices
+
+    matrices = assignment_matrices(backend, spins, shots, list(layout))
+    calibration_cache[key] = (now(), matrices)
+
+    return matrices
+
+######################################################################################################
+# INVERSION OF THE READOUT ERRORS ####################################################################
+######################################################################################################
+
+def dense_mitigation(count: dict, matrices: list, spins: int) -> dict:
+    '''
+    Applies the inverse of the tensor product of the assignment `matrices` to the distribution of
+    `count` over all the 2^n binary sequences, one qubit at a time.
+    '''
+    distribution = zeros(2 ** spins)
+
+    for state, value in count.items():
+        distribution[int(state, 2)] += value
+
+    distribution = distribution.reshape((2,) * spins) # Axis `a` is the qubit `spins - 1 - a`
+
+    for qubit, matrix in enumerate(matrices):
+        axis = spins - 1 - qubit
+        distribution = moveaxis(tensordot(inv(matrix), distribution, axes = ([1], [axis])), 0, axis)
+
+    distribution = distribution.reshape(-1)
+    return {format(k, f'0{spins}b'): distribution[k] for k in distribution.nonzero()[0]}
+
+def subspace_mitigation(count: dict, matrices: list, spins: int, distance: int = 3, block: int = 1024) -> dict:
+    '''
+    Inverts the readout errors in the subspace of the measured binary sequences only, as in the M3
+    method: the assignment matrix is restricted to them and to the pairs differing in at most
+    `distance` qubits, built `block` rows at a time as a sparse matrix, its columns are normalized
+    and the linear system is solved with GMRES.
+    '''
+    states = list(count)
+    bits = array([[int(state[spins - 1 - qubit]) for qubit in range(spins)] for state in states])
+    values = array([count[state] for state in states], dtype = float)
+    total = values.sum()
+    rows, columns, elements = [], [], []
+
+    for start in range(0, len(states), block):
+        near = ((bits[start:start + block, None, :] != bits[None, :, :]).sum(axis = 2) <= distance)
+        i, j = near.nonzero()
+        rows.append(i + start)
+        columns.append(j)
+        elements.append(prod([matrix[bits[i + start, q], bits[j, q]] for q, matrix in enumerate(matrices)], axis = 0))
+
+    reduced = csr_matrix((concatenate(elements), (concatenate(rows), concatenate(columns))), shape = (len(states),) * 2)
+    reduced = reduced @ diags(1 / asarray(reduced.sum(axis = 0)).reshape(-1)) # Normalization of the columns
+    solution, _ = gmres(reduced, values / total, x0 = values / total, rtol = 1e-10, atol = 1e-12)
+
+    return dict(zip(states, solution * total))
+
+def mitigate_counts(counts: list, matrices: list, spins: int, method: str = 'auto') -> list:
+    '''
+    Returns the `counts` corrected for the readout errors described by the assignment `matrices`,
+    using `dense_mitigation` (`method = 'dense'`), `subspace_mitigation` (`method = 'subspace'`) or,
+    with `method = 'auto'`, the first one up to 12 qubits and the second one above.
+    '''
+    if method == 'auto':
+        method = 'dense' if spins <= 12 else 'subspace'
+
+    if method not in ('dense', 'subspace'):
+        raise ValueError(f"Unknown method '{method}', expected 'auto', 'dense' or 'subspace'")
+
+    mitigation = dense_mitigation if method == 'dense' else subspace_mitigation
+
+    return [mitigation(count, matrices, spins) for count in counts]
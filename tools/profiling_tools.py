@@ -0,0 +1,109 @@
+from contextlib import contextmanager, nullcontext
+from json import dump
+from time import perf_counter
+from threading import local, Lock
+import tracemalloc
+
+######################################################################################################
+# OPT-IN INSTRUMENTATION OF THE SIMULATION STAGES ####################################################
+######################################################################################################
+
+# The simulators wrap each of their stages in `stage(name)`. Outside of `collect_stats` it returns a
+# shared empty context, so the instrumentation costs a function call per stage. The stages can run in
+# several threads, as the jobs of `run_experiments`: each thread keeps its own stack of frames, while
+# the traced memory is the one of the whole process.
+
+collectors = [] # Statistics of the active collections
+collectors_lock = Lock() # Updates of the statistics from several threads
+frames = local() # Memory of the stages being measured in each thread, innermost last
+no_stage = nullcontext()
+
+def thread_frames() -> list:
+    '''
+    Returns the stack of the frames of the stages being measured in the current thread.
+    '''
+    if not hasattr(frames, 'stack'):
+        frames.stack = []
+
+    return frames.stack
+
+def stage(name: str) -> object:
+    '''
+    Returns the context measuring the stage `name` for the active collections of statistics, if any.
+    '''
+    return measure(name) if collectors else no_stage
+
+@contextmanager
+def measure(name: str):
+    '''
+    Context recording the wall time, the number of calls and, if traced, the peak memory allocated
+    above the one at its start of the stage `name` in all the active collections.
+    '''
+    tracing = tracemalloc.is_tracing()
+    stack = thread_frames()
+
+    if tracing: # The peak of the outer stages is kept in their frames before resetting it
+        current, peak = tracemalloc.get_traced_memory()
+
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+
+        stack.append({'start': current, 'peak': 0})
+        tracemalloc.reset_peak()
+
+    start = perf_counter()
+
+    try:
+        yield
+    finally:
+        seconds = perf_counter() - start
+        peak_bytes = None
+
+        if tracing:
+            frame = stack.pop()
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - frame['start']
+
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+
+        with collectors_lock:
+            for stats in collectors:
+                record = stats.setdefault(name, {'calls': 0, 'seconds': 0., 'peak_bytes': None})
+                record['calls'] += 1
+                record['seconds'] += seconds
+
+                if peak_bytes is not None:
+                    record['peak_bytes'] = max(record['peak_bytes'] or 0, peak_bytes)
+
+@contextmanager
+def collect_stats(memory: bool = False):
+    '''
+    Context collecting, in the dictionary it returns, the statistics of each stage run inside it, as
+    `{name: {'calls': ..., 'seconds': ..., 'peak_bytes': ...}}`. The peak memory is only measured
+    with `memory`, which traces the allocations and slows down the simulations.
+    '''
+    stats = {}
+    start_tracing = memory and not tracemalloc.is_tracing()
+
+    if start_tracing:
+        tracemalloc.start()
+
+    with collectors_lock:
+        collectors.append(stats)
+
+    try:
+        yield stats
+    finally:
+        with collectors_lock:
+            collectors.remove(stats)
+
+        if start_tracing:
+            tracemalloc.stop()
+
+def dump_stats(stats: dict, file_name: str):
+    '''
+    Saves the statistics collected by `collect_stats` as JSON.
+    '''
+    with open(file_name, 'w') as file:
+        dump(stats, file, indent = 2)
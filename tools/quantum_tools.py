@@ -1,35 +1,198 @@
 from itertools import combinations
-from qiskit import QuantumCircuit, QuantumRegister, execute, transpile
-from numpy import zeros_like, array, abs, isclose, pi
+from collections import OrderedDict
+from qiskit import QuantumCircuit, QuantumRegister, execute, transpile, qpy, __version__ as qiskit_version
+from numpy import zeros, array, ndim, atleast_1d, tile, repeat, asarray
 from qiskit.circuit import Parameter
-from qiskit import transpile
-from numpy import exp
+from qiskit.primitives import Estimator, Sampler
+from qiskit.quantum_info import SparsePauliOp
+from os import environ, path, makedirs, replace, getpid
+from threading import Lock, get_ident
+from hashlib import sha256
 from qiskit.utils.mitigation import complete_meas_cal, CompleteMeasFitter
+from .counts_tools import probability_and_internal_energy, measure_coupling_energy, dense_counts, standard_errors
+from .backend_tools import backend_key, noise_key
+from .store_tools import append_record
+from .retrieval_tools import JobSpec, job_counts, job_observables
+from .mitigation_tools import cached_calibration, mitigate_counts
+from .profiling_tools import stage
+from .trotter_tools import trotter_layers, select_trotter_steps, trotter_statevectors, trotter_observables
 
-def quantum_simulator(times: list, spins: int, trotter_steps: int, coupling: float, backend: object, device_backend: object, shots: int, measure_mitigation: bool = False, our_mitigation: bool = False) -> (list, list, list):
+def quantum_simulator(times: list, spins: int, trotter_steps: int, coupling: float, backend: object, device_backend: object, shots: int, measure_mitigation: bool = False, our_mitigation: bool = False, exact: bool = False, store: str = None, order: int = 1, swap_network: bool = False, trotter_tolerance: float = 1e-2) -> (list, list, list):
     '''
-    Quantum simulation of our system given a `backend` and a number of `shots`.
+    Quantum simulation of our system given a `backend` and a number of `shots`. With `exact` the
+    observables of the trotterized states are instead evaluated exactly by `exact_expectations`.
+    With `measure_mitigation` the readout errors are mitigated with the cached tensored calibration
+    of `mitigation_tools`, or with the complete one of `error_mitigation` if it is 'complete'. With
+    a `store` directory the raw counts and the observables are appended to it by `append_record`.
+    The trotterization uses the product formula of `order` and, with `trotter_steps = 'auto'`, the
+    number of steps of `select_trotter_steps` within `trotter_tolerance`. With `swap_network` the RXX gates are ordered for
+    devices with linear connectivity, as in `rxx_layer`. With an array of couplings, the coupling is
+    a parameter of the circuits, transpiled once, and all the couplings and times run in a single
+    job: the observables are matrices with one row per coupling.
     '''
-    circuits = parametrized_circuits(times, spins, trotter_steps, coupling)
-    circuits = transpile(circuits, device_backend)
-    job = backend.run(circuits, shots = shots)
+    couplings = atleast_1d(asarray(coupling, dtype = float))
+    several = ndim(coupling) > 0
+
+    if trotter_steps == 'auto':
+        trotter_steps = max(select_trotter_steps(times, spins, g, trotter_tolerance, order) for g in couplings)
+
+    if exact and several:
+        results = [exact_expectations(times, spins, trotter_steps, g, order = order) for g in couplings]
+        return tuple(array(observable) for observable in zip(*results))
+
+    if exact:
+        return exact_expectations(times, spins, trotter_steps, coupling, order = order)
+
+    circuits = transpiled_circuits(times, spins, trotter_steps, coupling, device_backend, order, swap_network)
+
+    with stage('backend.run'):
+        job = backend.run(circuits, shots = shots)
     
-    # Getting the results
-    result = job.result()
+        # Getting the results
+        result = job.result()
+
+    # With several couplings the circuits are ordered by coupling and then by time
+    grid_times = tile(times, len(couplings)) if several else times
+    grid_couplings = repeat(couplings, len(times)) if several else coupling
     
-    if measure_mitigation:
-        meas_filter = error_mitigation(backend, spins, shots).filter
-        mitigated_result = meas_filter.apply(result) # Counting with error mitigation
-        counts = mitigated_result.get_counts()
-    else:
-        counts = result.get_counts()
+    probabilities, internal_energy, coupling_energy = result_observables(grid_times, result, spins, grid_couplings, backend,
+                                                                          shots, measure_mitigation, our_mitigation)
+
+    if store:
+        with stage('store'):
+            raw_counts = dense_counts(result.get_counts(), spins)
+            half = len(grid_times)
+
+            for k, g in enumerate(couplings): # A record for each coupling
+                rows = slice(k * len(times), (k + 1) * len(times))
+                observables = {'probabilities': probabilities[rows], 'internal_energy': internal_energy[rows],
+                               'coupling_energy': coupling_energy[rows]}
+                append_record(times, raw_counts[:half][rows], raw_counts[half:][rows], observables, store, spins = spins,
+                              trotter_steps = trotter_steps, coupling = g, shots = shots, backend = backend_key(backend)[0],
+                              noise = noise_key(backend), job_id = job.job_id(), measure_mitigation = measure_mitigation,
+                              our_mitigation = our_mitigation, order = order, swap_network = swap_network)
+
+    if several: # One row per coupling
+        shape = (len(couplings), len(times))
+        return probabilities.reshape(shape), internal_energy.reshape(shape), coupling_energy.reshape(shape)
+    
+    return probabilities, internal_energy, coupling_energy
+
+def result_observables(times: list, result: object, spins: int, coupling: float, backend: object, shots: int,
+                       measure_mitigation: bool = False, our_mitigation: bool = False) -> (list, list, list):
+    '''
+    Computes the probability of all spins up, the average internal energy and the average coupling
+    energy from the `result` of the circuits of `transpiled_circuits` run on `backend`, with the
+    mitigations of `quantum_simulator`.
+    '''
+    with stage('error_mitigation'):
+        if measure_mitigation == 'complete':
+            meas_filter = error_mitigation(backend, spins, shots).filter
+            mitigated_result = meas_filter.apply(result) # Counting with error mitigation
+            counts = mitigated_result.get_counts()
+        elif measure_mitigation: # Tensored calibration, cached between calls
+            matrices = cached_calibration(backend, spins, shots)
+            counts = mitigate_counts(result.get_counts(), matrices, spins)
+        else:
+            counts = result.get_counts()
 
     half = len(times)
     first_counts = counts[:half]
     second_counts = counts[half:]
+
+    with stage('probability_and_internal_energy'):
+        probabilities, internal_energy = probability_and_internal_energy(times, first_counts, spins, shots, our_mitigation)
+
+    with stage('measure_coupling_energy'):
+        coupling_energy = measure_coupling_energy(times, second_counts, coupling, spins, shots)
     
-    return *probability_and_internal_energy(times, first_counts, spins, shots, our_mitigation), \
-            measure_coupling_energy(times, second_counts, coupling, spins, shots)
+    return probabilities, internal_energy, coupling_energy
+
+def adaptive_simulator(times: list, spins: int, trotter_steps: int, coupling: float, backend: object, device_backend: object,
+                       tolerance: float, batch_shots: int = 1000, max_shots: int = 100000, our_mitigation: bool = False,
+                       order: int = 1, swap_network: bool = False) -> (list, list, list, tuple, list):
+    '''
+    Same as `quantum_simulator`, but the circuits of each time are run in batches of `batch_shots`
+    shots, accumulating their counts, until the `standard_errors` of its three observables are all
+    below `tolerance` or it reached `max_shots` shots. Returns the three observables, their standard
+    errors and the number of shots of each time.
+    '''
+    half = len(times)
+
+    if not half: # Nothing to run
+        empty = zeros(0)
+        return empty, empty, empty, (empty, empty, empty), zeros(0, dtype = int)
+
+    circuits = transpiled_circuits(times, spins, trotter_steps, coupling, device_backend, order, swap_network)
+    first_counts = zeros((half, 2 ** spins), dtype = int)
+    second_counts = zeros((half, 2 ** spins), dtype = int)
+    shots = zeros(half, dtype = int)
+    active = list(range(half))
+
+    while active:
+        with stage('backend.run'):
+            batch = [circuits[i] for i in active] + [circuits[half + i] for i in active]
+            counts = dense_counts(backend.run(batch, shots = batch_shots).result().get_counts(), spins)
+
+        first_counts[active] += counts[:len(active)]
+        second_counts[active] += counts[len(active):]
+        shots[active] += batch_shots
+
+        errors = standard_errors(times, first_counts, second_counts, coupling, spins, shots, our_mitigation)
+        precise = (errors[0] <= tolerance) & (errors[1] <= tolerance) & (errors[2] <= tolerance)
+        active = [i for i in range(half) if not precise[i] and shots[i] + batch_shots <= max_shots]
+
+    probabilities, internal_energy = probability_and_internal_energy(times, first_counts, spins, shots, our_mitigation)
+    coupling_energy = measure_coupling_energy(times, second_counts, coupling, spins, shots)
+
+    return probabilities, internal_energy, coupling_energy, errors, shots
+
+def pauli_observables(spins: int) -> (object, object):
+    '''
+    Returns, as Pauli sums, the total spin angular momentum along z and the sum over the pairs of the
+    products of the Pauli x operators. The projector on the state with all spins up is not among
+    them, as it is the sum of all the 2^n products of Pauli z operators.
+    '''
+    sz = SparsePauliOp.from_sparse_list([('Z', [q], 1 / 2) for q in range(spins)], spins)
+    pairs = SparsePauliOp.from_sparse_list([('XX', list(pair), 1) for pair in combinations(range(spins), 2)], spins)
+
+    return sz, pairs
+
+def exact_expectations(times: list, spins: int, trotter_steps: int, coupling: float, estimator: object = None,
+                       order: int = 1, sampler: object = None) -> (list, list, list):
+    '''
+    Evaluates without shot noise the probability of all spins up, the average internal energy and
+    the average coupling energy of the trotterized states. By default the statevectors of all the
+    times are simulated together by `trotter_statevectors`, and all the observables are read from
+    them. If `estimator` or `sampler` are given, a single parametric circuit, without measurements,
+    runs instead on the primitives (the missing one being the statevector based one): the
+    probability is the one of the all zeros outcome of the measured circuit on `sampler`, the
+    others come from `estimator`.
+    '''
+    if estimator is None and sampler is None:
+        with stage('trotter_statevectors'):
+            states = trotter_statevectors(times, spins, trotter_steps, coupling, order)
+
+        return trotter_observables(states, spins, coupling)
+
+    theta = Parameter('θ')
+    circuit = trotter_circuit(spins, theta, trotter_steps, coupling, order)
+    estimator = estimator or Estimator()
+    sampler = sampler or Sampler()
+
+    operators = pauli_observables(spins)
+    parameters = [[time] for time in times for _ in operators]
+    job = estimator.run([circuit] * len(parameters), list(operators) * len(times), parameters)
+    values = job.result().values.reshape(len(times), len(operators))
+
+    parameters = [[time] for time in times]
+    job = sampler.run([circuit.measure_all(inplace = False)] * len(times), parameters)
+    probabilities = array([distribution.get(0, 0.) for distribution in job.result().quasi_dists])
+
+    internal_energy = values[:, 0] / spins + 1 / 2
+    coupling_energy = - coupling * values[:, 1] / spins / 2
+
+    return probabilities, internal_energy, coupling_energy
 
 ######################################################################################################
 # NOISE MITIGATION ###################################################################################
@@ -49,141 +212,217 @@ def error_mitigation(backend: object, spins: int, shots):
     return meas_fitter
 
 ######################################################################################################
-# USING THE OBTAINED COUNTS TO FIND THE AVERAGES ENERGIES ############################################
+# DEFINITION OF THE CIRCUITS #########################################################################
 ######################################################################################################
 
-def measure_coupling_energy(quantum_times: list, counts: list, coupling: float, spins: int, shots: int) -> list:
+def rxx_layer(circuit: object, spins: int, angle: float, swap_network: bool = False):
     '''
-    Counts the results obtained from the quantum simulation to compute the average coupling energy,
-    that is the expectation value of the square total spin angular momentum along the x direction
+    Adds to `circuit` a RXX gate of `angle` on each pair of qubits, in lexicographic order or, with
+    `swap_network`, along the odd-even transposition network: `spins` rounds of gates on alternating
+    nearest neighbours, each followed by a SWAP, so that every pair meets once on a line of qubits.
+    The network leaves the qubits in reversed order.
     '''
-    quantum_coupling_energy = zeros_like(quantum_times)
-
-    # Counting to compute the total average square spin operator
-    for index, count in enumerate(counts):
-        for sequence in range(2 ** spins): # Iterating an all `binary sequences`
-            state, state_count = state_and_count(sequence, spins, count)
-            
-            for first, second in combinations(range(spins), 2): # Iterating on all pairs of characters
-                coefficent = -1 if state[first] == state[second] else 1
-                quantum_coupling_energy[index] += coefficent * state_count
-
-        quantum_coupling_energy[index] *= coupling / spins / shots / 2
-        
-    return quantum_coupling_energy
+    if not swap_network:
+        for first, second in combinations(range(spins), 2):
+            circuit.rxx(angle, first, second)
 
-def probability_and_internal_energy(quantum_times: list, counts: list, spins: int, shots: int, our_mitigation: bool) -> (list, list):
-    '''
-    Counts the results obtained from the quantum simulation to compute the average internal energy,
-    that is the expectation value of the total spin angular momentum along the z direction
-    '''
-    quantum_internal_energy = zeros_like(quantum_times)
-    quantum_probabilities = zeros_like(quantum_times)
-    initial_parity = parity_operator(- spins / 2)
-    
-    for index, count in enumerate(counts):
-        state_up = bin(0)[2:].zfill(spins) # Counting to compute tre probability of all spins up
-        quantum_probabilities[index] = count.get(state_up, 0) / shots
-        eliminated = 0
-        counted = 0
-            
-        for sequence in range(2 ** spins): # Counting to compute the total average magnetization
-            state, state_count = state_and_count(sequence, spins, count)
-            total_spin = array([1 if char == '0' else -1 for char in list(state)]).sum() / 2
-
-            if our_mitigation:
-                if isclose(parity_operator(total_spin), initial_parity): # Parity must conserve
-                    counted += state_count
-                    quantum_internal_energy[index] += total_spin * state_count
-            else:
-                quantum_internal_energy[index] += total_spin * state_count
-                
-        factor = counted if our_mitigation else shots
-        quantum_internal_energy[index] /= spins * factor
-        quantum_internal_energy[index] += 1 / 2 
-        
-    return quantum_probabilities, quantum_internal_energy
-    
-def parity_operator(total_spin: float) -> float:
-    '''
-    Returns the value take by the parity operator
-    '''
-    exponent = (pi * total_spin) % (2 * pi)
-    
-    return exp(1j * exponent)
-    
-def state_and_count(decimal: int, spins: int, count: dict) -> (list, int):     
-    '''
-    ...
-    '''
-    state_string = bin(decimal)[2:].zfill(spins) # Converting decimal to binary sequence
-    state_count = count.get(state_string, 0) # Counts related to the state defined by the sequence
-    state = list(state_string) # Converting the string to a list of characters
+        return
 
-    return state, state_count
+    for layer in range(spins):
+        for first in range(layer % 2, spins - 1, 2):
+            second = first + 1
 
-######################################################################################################
-# DEFINITION OF THE CIRCUITS #########################################################################
-######################################################################################################
+            # RXX followed by SWAP with three CNOTs, conjugating RZZ followed by SWAP by Hadamards
+            circuit.h([first, second])
+            circuit.cx(first, second)
+            circuit.rz(angle, second)
+            circuit.cx(second, first)
+            circuit.cx(first, second)
+            circuit.h([first, second])
 
-def get_circuit(spins: int, time_step: float, coupling: float) -> object:
+def get_circuit(spins: int, time_step: float, coupling: float, swap_network: bool = False) -> object:
     '''
     Returns a circuit implementing a single step of trotterization.
     '''
     circuit = QuantumCircuit(spins)
     circuit.rz(time_step, [i for i in range(spins)])
-
-    for first, second in combinations(range(spins), 2):
-        circuit.rxx(- coupling * time_step, first, second)
+    rxx_layer(circuit, spins, - coupling * time_step, swap_network)
     
     return circuit
         
-def trotter_circuit(spins: int, time: float, steps: int, coupling: float) -> object:
+def trotter_circuit(spins: int, time: float, steps: int, coupling: float, order: int = 1,
+                    swap_network: bool = False) -> object:
     '''
     Returns a circuit implementing the trotterized evolution of our system with `steps` trotter
-    steps, thus composes `steps` circuits.
+    steps of the product formula of `order` (see `suzuki_step`): the first order one composes
+    `steps` circuits of `get_circuit`, the higher order ones merge the RZ layers between the steps.
+    With `swap_network` the RXX gates act on nearest neighbours only, as in `rxx_layer`, and the
+    qubits end in reversed order after an odd number of RXX layers. As the initial state and the
+    Hamiltonian are symmetric under permutations, the measured observables do not change.
     '''
     time_step = time / steps
     circuit = QuantumCircuit(spins)
     circuit.x([i for i in range(spins)])
+
+    layers = trotter_layers(order, steps)
+    last = max(index for index, (layer, _) in enumerate(layers) if layer == 'xx')
     
-    # Adding the trotter steps
-    for _ in range(steps - 1): # For each trotter step we compose a new single circuit
-        single_circuit = get_circuit(spins, time_step, coupling)
-        circuit = circuit.compose(single_circuit)
-        circuit.barrier()
-    
-    single_circuit = get_circuit(spins, time_step, coupling)
-    circuit = circuit.compose(single_circuit)
+    # Adding the layers of the trotter steps, separated by barriers after their RXX gates
+    for index, (layer, fraction) in enumerate(layers):
+        angle = time_step if fraction == 1 else time_step * fraction
+
+        if layer == 'z':
+            circuit.rz(angle, [i for i in range(spins)])
+            continue
+
+        rxx_layer(circuit, spins, - coupling * angle, swap_network)
+
+        if index < last:
+            circuit.barrier()
 
     return circuit
 
-def parametrized_circuits(times: list, spins: int, trotter_steps: int, coupling: float) -> list:
+def parametric_templates(spins: int, trotter_steps: int, coupling: float, order: int = 1,
+                         swap_network: bool = False) -> (object, object):
     '''
-    Returns a list of circuits to perform the quantum simulation of the time evolutions
+    Returns the two circuits, depending on the time parameter θ, measuring along z (probability and
+    average internal energy) and along x (coupling energy) respectively. With `coupling = None` the
+    coupling is a second parameter g.
     '''
     theta = Parameter('θ')
-    circuit = trotter_circuit(spins, theta, trotter_steps, coupling)
+    coupling = Parameter('g') if coupling is None else coupling
+    circuit = trotter_circuit(spins, theta, trotter_steps, coupling, order, swap_network)
     
-    # Circuits for measuring probability and average internal energy
+    # Circuit for measuring probability and average internal energy
     first_circuit = circuit.copy()
     first_circuit.measure_all()
-    first_circuits = [first_circuit.bind_parameters({theta: time}) for time in times]
 
-    # Circuits for measuring coupling energy
+    # Circuit for measuring coupling energy
     second_circuit = circuit.copy()
     second_circuit.h([i for i in range(spins)]) # Adding the Hadamard gates to measure along x
     second_circuit.measure_all()
-    second_circuits = [second_circuit.bind_parameters({theta: time}) for time in times]
 
-    return first_circuits + second_circuits
+    return first_circuit, second_circuit
+
+def parametrized_circuits(times: list, spins: int, trotter_steps: int, coupling: float, order: int = 1,
+                          swap_network: bool = False) -> list:
+    '''
+    Returns a list of circuits to perform the quantum simulation of the time evolutions, for each of
+    the couplings if `coupling` is an array
+    '''
+    if ndim(coupling) > 0:
+        return bind_times(parametric_templates(spins, trotter_steps, None, order, swap_network), times, coupling)
+
+    templates = parametric_templates(spins, trotter_steps, coupling, order, swap_network)
+
+    return bind_times(templates, times)
+
+def bind_times(templates: list, times: list, couplings: list = None) -> list:
+    '''
+    Binds the time parameter of each of the `templates` to each of the `times`, returning first all
+    the circuits of the first template, then all the ones of the second and so on. For templates
+    with the coupling parameter, binds it to each of the `couplings`, with the times of the same
+    coupling together.
+    '''
+    if couplings is None:
+        return [template.assign_parameters([time]) for template in templates for time in times]
+
+    circuits = []
+
+    for template in templates: # The parameters are sorted by name, thus found by it
+        theta, g = (next(p for p in template.parameters if p.name == name) for name in ('θ', 'g'))
+        circuits += [template.assign_parameters({theta: time, g: coupling}) for coupling in couplings for time in times]
+
+    return circuits
+
+######################################################################################################
+# TRANSPILATION CACHE ################################################################################
+######################################################################################################
+
+transpile_cache_dir = environ.get('QB_TRANSPILE_CACHE', path.join(path.expanduser('~'), '.cache', 'quantum_batteries'))
+transpile_cache_schema = 2 # To be increased when the circuits built for the same key change
+transpile_cache = OrderedDict() # Least recently used first
+transpile_cache_size = 16
+transpile_cache_lock = Lock() # Lookups and updates from the threads of the quantum sweeps
+
+def transpiled_templates(spins: int, trotter_steps: int, coupling: float, device_backend: object, 
+                         cache_dir: str = None, order: int = 1, swap_network: bool = False) -> list:
+    '''
+    Returns the templates of `parametric_templates` transpiled for `device_backend`. They are kept in
+    memory and, as QPY files, in `cache_dir` (by default `transpile_cache_dir`, disabled if empty),
+    so that each configuration is transpiled only once. The files are specific to the version of
+    Qiskit and to `transpile_cache_schema`, while only the `transpile_cache_size` most recently used
+    templates are kept in memory. A file that cannot be read, as one cut by an interrupted write, is
+    replaced by transpiling again. With `coupling = None` the coupling is the second parameter of the
+    templates.
+    '''
+    key = (spins, trotter_steps, None if coupling is None else float(coupling), backend_key(device_backend),
+           order, swap_network, qiskit_version, transpile_cache_schema)
+
+    with transpile_cache_lock:
+        if key in transpile_cache:
+            transpile_cache.move_to_end(key)
+            return transpile_cache[key]
+
+    cache_dir = transpile_cache_dir if cache_dir is None else cache_dir
+    file_name = path.join(cache_dir, sha256(repr(key).encode()).hexdigest() + '.qpy') if cache_dir else None
+    templates = None
+
+    if file_name and path.exists(file_name):
+        try:
+            with stage('transpile_cache.load'), open(file_name, 'rb') as file:
+                templates = qpy.load(file)
+        except Exception: # Unreadable, transpiled again below
+            templates = None
+
+    if templates is None:
+        with stage('parametrized_circuits'):
+            templates = list(parametric_templates(spins, trotter_steps, coupling, order, swap_network))
+
+        with stage('transpile'):
+            templates = transpile(templates, device_backend)
+
+        if file_name:
+            makedirs(cache_dir, exist_ok = True)
+            temporary_name = f'{file_name}.{getpid()}.{get_ident()}.tmp' # Private to this thread
+
+            with open(temporary_name, 'wb') as file:
+                qpy.dump(templates, file)
+
+            replace(temporary_name, file_name)
+
+    with transpile_cache_lock:
+        transpile_cache[key] = templates
+        transpile_cache.move_to_end(key)
+
+        if len(transpile_cache) > transpile_cache_size:
+            transpile_cache.popitem(last = False)
+
+    return templates
+
+def transpiled_circuits(times: list, spins: int, trotter_steps: int, coupling: float, device_backend: object,
+                        order: int = 1, swap_network: bool = False) -> list:
+    '''
+    Same as `parametrized_circuits`, but transpiled for `device_backend` through the cache of
+    `transpiled_templates`.
+    '''
+    several = ndim(coupling) > 0
+    templates = transpiled_templates(spins, trotter_steps, None if several else coupling, device_backend, order = order,
+                                     swap_network = swap_network)
+
+    with stage('bind_parameters'):
+        return bind_times(templates, times, coupling if several else None)
 
 ########################################
 
-def data_from_job(qt, n, g, shots, device_backend, job_id, our_mitigation):
-    job = device_backend.retrieve_job(job_id)
-    result = job.result()
-    counts = result.get_counts()
-    half = len(qt)
-    return *probability_and_internal_energy(qt, counts[:half], n, shots, our_mitigation), \
-           measure_coupling_energy(qt, counts[half:], g, n, shots)
\ No newline at end of file
+def data_from_job(qt, n, g, shots, device_backend, job_id, our_mitigation, store: str = None, couplings: list = None):
+    '''
+    Returns the probability of all spins up, the average internal energy and the average coupling
+    energy measured by the job `job_id` of `device_backend`, which ran the array of `couplings` if
+    given, for the coupling `g`. Its counts are kept, as dense arrays, in `store` (by default the
+    `store_dir` of `store_tools`, disabled if empty), so that each job is only retrieved once. Many
+    jobs are retrieved concurrently by `retrieve_jobs`.
+    '''
+    spec = JobSpec(job_id, qt, n, g, shots, couplings)
+
+    return job_observables(spec, *job_counts(spec, device_backend, store), our_mitigation)
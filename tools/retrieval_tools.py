@@ -0,0 +1,169 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import sleep
+from .backend_tools import backend_name
+from .counts_tools import dense_counts, probability_and_internal_energy, measure_coupling_energy
+from .store_tools import store_dir, append_record, find_records, load_record
+
+######################################################################################################
+# RETRIEVAL OF THE COUNTS OF THE DEVICE JOBS #########################################################
+######################################################################################################
+
+JobSpec = namedtuple('JobSpec', ['job_id', 'times', 'spins', 'coupling', 'shots', 'couplings'], defaults = [None])
+JobSpec.__doc__ = '''
+Job of `device_backend` running the circuits of `quantum_simulator` at `times` for `spins` two-level
+systems with `coupling`, measured `shots` times. If the job ran an array of couplings, `couplings` is
+that array, which `coupling` is one of.
+'''
+
+def with_retries(function: object, retries: int = 3, backoff: float = 1.) -> object:
+    '''
+    Returns the value of `function()`, calling it again up to `retries` times if it raises, after
+    waiting `backoff` seconds, then twice as long and so on.
+    '''
+    for attempt in range(retries + 1):
+        try:
+            return function()
+        except Exception:
+            if attempt == retries:
+                raise
+
+            sleep(backoff * 2 ** attempt)
+
+def split_counts(spec: JobSpec, counts: list) -> list:
+    '''
+    Returns the dense counts along z and along x of each coupling of the job of `spec`, whose
+    circuits are ordered as in `quantum_simulator`: first those measuring along z, then those
+    measuring along x, each ordered by coupling and then by time.
+    '''
+    couplings = [spec.coupling] if spec.couplings is None else spec.couplings
+    size = len(couplings) * len(spec.times)
+
+    if len(counts) != 2 * size:
+        raise ValueError(f'The job {spec.job_id} has {len(counts)} circuits, expected {2 * size} for '
+                         f'{len(couplings)} couplings and {len(spec.times)} times')
+
+    rows = [slice(k * len(spec.times), (k + 1) * len(spec.times)) for k in range(len(couplings))]
+
+    return [(counts[:size][k], counts[size:][k]) for k in rows]
+
+def grouped_job_counts(specs: list, device_backend: object, store: str = None, retries: int = 0, backoff: float = 1.) -> list:
+    '''
+    Returns the dense counts of the circuits measuring along z and along x for each of the `specs`
+    of the same job, which can hold several couplings, looked up in `store` (by default the
+    `store_dir` of `store_tools`, disabled if empty) by job id, number of spins and coupling. The
+    job is retrieved, with up to `retries` retries, only if some of them are missing, and then the
+    counts of all its couplings are kept in `store`, so that each job is only retrieved once.
+    '''
+    store = store_dir if store is None else store
+    counts = [None] * len(specs)
+
+    for i, spec in enumerate(specs):
+        keys = find_records(store, job_id = spec.job_id, spins = spec.spins, coupling = float(spec.coupling)) if store else []
+
+        if len(keys) > 1: # Ambiguous, rather than reading the counts of another run
+            raise ValueError(f'Several records of the job {spec.job_id} with {spec.spins} spins and coupling {spec.coupling}')
+
+        if keys:
+            record = load_record(keys[0], store)
+            counts[i] = record['z_counts'], record['x_counts']
+
+    if all(pair is not None for pair in counts):
+        return counts
+
+    spec = specs[0]
+    result = with_retries(lambda: device_backend.retrieve_job(spec.job_id).result(), retries, backoff)
+    couplings = [spec.coupling] if spec.couplings is None else spec.couplings
+    by_coupling = dict(zip(map(float, couplings), split_counts(spec, dense_counts(result.get_counts(), spec.spins))))
+
+    for i, spec in enumerate(specs):
+        if float(spec.coupling) not in by_coupling:
+            raise ValueError(f'The coupling {spec.coupling} is not among the ones of the job {spec.job_id}')
+
+        if counts[i] is None:
+            counts[i] = by_coupling[float(spec.coupling)]
+
+    if store:
+        for g, (z_counts, x_counts) in by_coupling.items():
+            if find_records(store, job_id = spec.job_id, spins = spec.spins, coupling = g):
+                continue
+
+            coupling_spec = spec._replace(coupling = g)
+            observables = dict(zip(['probabilities', 'internal_energy', 'coupling_energy'], job_observables(coupling_spec, z_counts, x_counts)))
+            append_record(spec.times, z_counts, x_counts, observables, store, spins = spec.spins, coupling = g,
+                          shots = spec.shots, backend = backend_name(device_backend), job_id = spec.job_id)
+
+    return counts
+
+def job_counts(spec: JobSpec, device_backend: object, store: str = None, retries: int = 0, backoff: float = 1.) -> (list, list):
+    '''
+    Returns the dense counts of the circuits measuring along z and along x of the job of `spec`, kept
+    in `store` as in `grouped_job_counts`.
+    '''
+    return grouped_job_counts([spec], device_backend, store, retries, backoff)[0]
+
+def job_observables(spec: JobSpec, z_counts: list, x_counts: list, our_mitigation: bool = False) -> (list, list, list):
+    '''
+    Returns the probability of all spins up, the average internal energy and the average coupling
+    energy from the dense counts of the job of `spec`.
+    '''
+    return *probability_and_internal_energy(spec.times, z_counts, spec.spins, spec.shots, our_mitigation), \
+           measure_coupling_energy(spec.times, x_counts, spec.coupling, spec.spins, spec.shots)
+
+def retrieve_jobs(specs: list, device_backend: object, our_mitigation: bool = False, store: str = None,
+                  workers: int = 8, retries: int = 3, backoff: float = 1.) -> object:
+    '''
+    Generator retrieving the jobs of `specs` on a pool of at most `workers` threads, each with up to
+    `retries` retries, and yielding `(spec, (probabilities, internal energy, coupling energy))` for
+    each of them as soon as its counts are processed, in order of completion. The specs of the same
+    job, as its couplings, share a single retrieval. The counts are kept in `store` as in
+    `grouped_job_counts`, so the jobs already retrieved are only read from it.
+    '''
+    groups = {}
+
+    for spec in specs:
+        groups.setdefault(spec.job_id, []).append(spec)
+
+    def process(group):
+        counts = grouped_job_counts(group, device_backend, store, retries, backoff)
+        return [job_observables(spec, *pair, our_mitigation) for spec, pair in zip(group, counts)]
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {executor.submit(process, group): group for group in groups.values()}
+
+        for future in as_completed(futures):
+            yield from zip(futures[future], future.result())
+
+######################################################################################################
+# OFFLINE STAND-IN OF A DEVICE BACKEND ###############################################################
+######################################################################################################
+
+# Duck-typed replacement of a device backend exposing only `retrieve_job`, to exercise the retrieval
+# without network access: each job returns canned counts after `latency` seconds, and the ones in
+# `failures` raise `ConnectionError` their first `failures[job_id]` times.
+
+CannedJob = namedtuple('CannedJob', ['job_id', 'counts'])
+CannedJob.result = lambda self: self # The job is its own result
+CannedJob.get_counts = lambda self: self.counts
+
+class StandInBackend:
+    '''
+    Offline backend returning the counts of `results`, a dictionary of lists of counts dictionaries
+    by job id, after `latency` seconds.
+    '''
+    def __init__(self, results: dict, latency: float = 0.1, failures: dict = None, name: str = 'stand_in'):
+        self.results = results
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.name = name
+        self.retrievals = [] # Job ids of the calls to `retrieve_job`, in order
+
+    def retrieve_job(self, job_id: str) -> object:
+        self.retrievals.append(job_id)
+        sleep(self.latency)
+
+        if self.failures.get(job_id, 0) > 0:
+            self.failures[job_id] -= 1
+            raise ConnectionError(f'Stand-in failure retrieving {job_id}')
+
+        return CannedJob(job_id, self.results[job_id])
@@ -0,0 +1,130 @@
+from json import dumps, loads
+from hashlib import sha256
+from os import environ, path, makedirs, replace, listdir
+from threading import Lock
+from numpy import asarray, concatenate, load as load_array, save
+
+######################################################################################################
+# COLUMNAR STORE OF THE RESULTS ######################################################################
+######################################################################################################
+
+# A store is a directory with an `index.jsonl` of the tags of its records, one line per record, and
+# for each record a directory of `.npy` columns sharing their first axis with `times`: the dense
+# counts of `dense_counts` of the circuits measuring along z and along x, and the observables. Each
+# append writes a new chunk `<column>.<chunk>.npy` of every column, and only records created by it
+# add a line to the index, so appending never rewrites the stored data. The columns are read memory
+# mapped, so that plotting or mitigating again a campaign neither runs nor retrieves jobs.
+
+store_dir = environ.get('QB_RESULT_STORE', path.join(path.expanduser('~'), '.cache', 'quantum_batteries', 'results'))
+store_lock = Lock() # Appends from the threads of the quantum sweeps
+
+def record_key(tags: dict) -> str:
+    '''
+    Returns the name of the record with the given `tags`.
+    '''
+    return sha256(dumps(tags, sort_keys = True, default = str).encode()).hexdigest()[:16]
+
+def load_index(store: str = None) -> dict:
+    '''
+    Returns the dictionary of the tags of the records in `store` (by default `store_dir`), by name.
+    '''
+    file_name = path.join(store or store_dir, 'index.jsonl')
+
+    if not path.exists(file_name):
+        return {}
+
+    with open(file_name) as file: # A line cut by an interrupted append is skipped
+        entries = [loads(line) for line in file if line.endswith('\n')]
+
+    return {entry['key']: entry['tags'] for entry in entries}
+
+def find_records(store: str = None, **tags) -> list:
+    '''
+    Returns the names of the records of `store` whose tags include the given ones, as in
+    `find_records(store, spins = 4, job_id = '...')`.
+    '''
+    return [key for key, record in load_index(store).items()
+            if all(record.get(name) == value for name, value in tags.items())]
+
+def record_chunks(directory: str) -> dict:
+    '''
+    Returns the file names of the chunks of each column in the record `directory`, by column, in
+    order and only for the chunks whose `times` were written, that is of the completed appends.
+    '''
+    chunks = {}
+
+    for file_name in sorted(listdir(directory)):
+        name, chunk, extension = file_name.rsplit('.', 2) if file_name.count('.') >= 2 else (file_name, '', '')
+
+        if extension == 'npy' and chunk.isdigit():
+            chunks.setdefault(name, []).append(file_name)
+
+    completed = len(chunks.get('times', []))
+
+    return {name: file_names[:completed] for name, file_names in chunks.items()}
+
+def completed_chunks(directory: str) -> int:
+    '''
+    Returns the number of completed appends to the record `directory`, that is of its `times` chunks,
+    checking their existence by doubling and then bisecting instead of listing all the chunks.
+    '''
+    exists = lambda chunk: path.exists(path.join(directory, f'times.{chunk:05d}.npy'))
+    upper = 1
+
+    while exists(upper - 1):
+        upper *= 2
+
+    lower = upper // 2 # Number of chunks known to exist
+
+    while upper - lower > 1:
+        middle = (lower + upper) // 2
+
+        if exists(middle - 1):
+            lower = middle
+        else:
+            upper = middle
+
+    return lower
+
+def append_record(times: list, z_counts: list, x_counts: list, observables: dict, store: str = None, **tags) -> str:
+    '''
+    Appends to the record with the given `tags` (the number of two-level systems `spins`, the
+    `trotter_steps`, the `coupling`, the `shots`, the `backend`, the `noise` and the `job_id`) of
+    `store` the dense counts of the circuits measuring along z and x at `times`, and the arrays of
+    `observables` at the same times, creating it if needed. Returns the name of the record.
+    '''
+    store = store or store_dir
+    tags = {name: value.item() if hasattr(value, 'item') else value for name, value in tags.items()}
+    key = record_key(tags)
+    directory = path.join(store, key)
+    columns = {'z_counts': z_counts, 'x_counts': x_counts, **observables, 'times': times} # Times last
+
+    with store_lock:
+        makedirs(directory, exist_ok = True)
+        chunk = completed_chunks(directory)
+
+        if not chunk: # New record, possibly listed already by an interrupted append
+            with open(path.join(store, 'index.jsonl'), 'a') as file:
+                file.write(dumps({'key': key, 'tags': tags}) + '\n')
+
+        for name, column in columns.items():
+            file_name = path.join(directory, f'{name}.{chunk:05d}.npy')
+            save(file_name + '.tmp.npy', asarray(column))
+            replace(file_name + '.tmp.npy', file_name)
+
+    return key
+
+def load_record(key: str, store: str = None, mmap: bool = True) -> dict:
+    '''
+    Returns the columns of the record `key` of `store` by name, together with its `tags`. The chunks
+    are memory mapped unless `mmap` is false, and the columns of several chunks are concatenated.
+    '''
+    store = store or store_dir
+    directory = path.join(store, key)
+    record = {'tags': load_index(store)[key]}
+
+    for name, file_names in record_chunks(directory).items():
+        chunks = [load_array(path.join(directory, file_name), mmap_mode = 'r' if mmap else None) for file_name in file_names]
+        record[name] = chunks[0] if len(chunks) == 1 else concatenate(chunks)
+
+    return record
@@ -0,0 +1,193 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import product
+from numpy import array, asarray, argmax, argsort, concatenate, full, nan, abs
+from scipy.optimize import minimize_scalar
+from os import cpu_count
+from .classical_tools import classical_simulator, dicke_simulator, spectral_decomposition, clear_caches
+
+SweepResult = namedtuple('SweepResult', ['spins', 'couplings', 'trotter_steps', 'power', 'time'])
+SweepResult.__doc__ = '''
+Maximal average power, and the time at which it is reached, on the grid of numbers of two-level
+systems, couplings and trotter steps: `power[i, j, k]` refers to `spins[i]`, `couplings[j]` and
+`trotter_steps[k]`.
+'''
+
+def maximal_power(times: list, internal_energy: list) -> (float, float):
+    '''
+    Returns the maximal average power, that is the maximum over the positive times of the internal
+    energy divided by the time, and the time at which it is reached.
+    '''
+    times = asarray(times, dtype = float)
+    positive = times > 0
+    powers = asarray(internal_energy)[positive] / times[positive]
+    best = argmax(powers)
+
+    return powers[best], times[positive][best]
+
+def engine_simulation(spins: int, coupling: float, trotter_steps: int = None, engine: str = 'classical', **options) -> object:
+    '''
+    Returns the function of the times returning the probability of all spins up, the average
+    internal energy and the average coupling energy simulated with `engine` ('classical', 'dicke' or
+    'quantum', to which the `options` are passed).
+    '''
+    if engine == 'classical':
+        return lambda times: classical_simulator(times, spins, coupling, **options)
+
+    if engine == 'dicke':
+        return lambda times: dicke_simulator(times, spins, coupling)
+
+    from .quantum_tools import quantum_simulator # Qiskit is only loaded by the quantum sweeps
+
+    return lambda times: quantum_simulator(times, spins, trotter_steps, coupling, **options)
+
+def power_point(point: tuple) -> (float, float):
+    '''
+    Simulates a single point of the sweep, given as `(times, spins, coupling, trotter_steps, engine,
+    search, options)`, and returns its maximal average power and the time at which it is reached, on
+    the `times` or, with `search`, refined by `maximal_power_search`.
+    '''
+    times, spins, coupling, trotter_steps, engine, search, options = point
+    simulate = engine_simulation(spins, coupling, trotter_steps, engine, **options)
+
+    if search:
+        return maximal_power_search(simulate, times)
+
+    _, internal_energy, _ = simulate(times)
+
+    return maximal_power(times, internal_energy)
+
+def spin_points(points: list) -> list:
+    '''
+    Simulates with `power_point` the classical `points` of the sweep of the same number of two-level
+    systems in the same process, so that the cached operators of `spin_operators` are built once.
+    The decompositions of `spectral_decomposition`, which depend on the coupling too, are never
+    reused by the sweep, so they are dropped after each point, and the operators after the last one,
+    not to keep their dense matrices in the process.
+    '''
+    results = []
+
+    for point in points:
+        results.append(power_point(point))
+        spectral_decomposition.cache_clear()
+
+    clear_caches()
+
+    return results
+
+def power_sweep(times: list, spins: list, couplings: list, trotter_steps: list = (None,), 
+                engine: str = 'classical', workers: int = None, search: bool = False, **options) -> SweepResult:
+    '''
+    Computes the maximal average power on the grid of `spins`, `couplings` and `trotter_steps`.
+    With `engine` equal to 'classical' or 'dicke' the points run on a pool of `workers` processes
+    (all the cores by default), with the points of the same number of two-level systems split in
+    about `workers` chunks, each sent to a process by `spin_points` so that the cached operators are
+    reused within it, and the trotter steps are ignored. With `engine = 'quantum'` the points run on
+    a pool of threads and the `options` (`backend`, `device_backend`, `shots`, ...) are passed to
+    `quantum_simulator`. With `search` the `times` are only the coarse grid bracketing the maximum
+    of `maximal_power_search`.
+    '''
+    if engine not in ('classical', 'dicke', 'quantum'):
+        raise ValueError(f"Unknown engine '{engine}', expected 'classical', 'dicke' or 'quantum'")
+
+    workers = workers or cpu_count()
+    quantum = engine == 'quantum'
+    steps = trotter_steps if quantum else (None,) # The classical simulations do not depend on them
+    options = {'cache': True, **options} if engine == 'classical' else options # Cleared by `spin_points`
+    points = [(times, n, g, m, engine, search, options) for n, g, m in product(spins, couplings, steps)]
+
+    if quantum: # The backends are shared between threads rather than sent to processes
+        with ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(power_point, points))
+    else:
+        size = -(-len(couplings) // workers) # Chunks of the points of each number of spins
+        groups = [points[i:min(i + size, start + len(couplings))] for start in range(0, len(points), len(couplings))
+                  for i in range(start, start + len(couplings), size)]
+
+        with ProcessPoolExecutor(workers) as executor:
+            results = [result for group in executor.map(spin_points, groups) for result in group]
+
+    power = full((len(spins), len(couplings), len(steps)), nan)
+    time = full((len(spins), len(couplings), len(steps)), nan)
+
+    for index, (point_power, point_time) in zip(product(*map(range, power.shape)), results):
+        power[index], time[index] = point_power, point_time
+
+    if not quantum: # Same result for each number of trotter steps
+        power = power.repeat(len(trotter_steps), axis = 2)
+        time = time.repeat(len(trotter_steps), axis = 2)
+
+    return SweepResult(asarray(spins), asarray(couplings), asarray(trotter_steps), power, time)
+
+######################################################################################################
+# ADAPTIVE TIME SAMPLING #############################################################################
+######################################################################################################
+
+# `simulate` is a function of an array of times returning the three observables, as the simulators
+# or `engine_simulation`. Each of its calls takes a whole batch of times, that is a single job on the
+# quantum side.
+
+def adaptive_sampling(simulate: object, times: list, tolerance: float = 1e-3, max_points: int = 257) -> (list, tuple):
+    '''
+    Refines the grid of `times`, halving the intervals in which an observable at the midpoint
+    differs from the linear interpolation of the extremes by more than `tolerance`, until none does
+    or the grid has `max_points` times. When the intervals to check exceed the remaining points,
+    the ones with the largest expected errors are kept: the error of the interval they halve or,
+    for the first grid, the largest change of an observable across them. Returns the times and the
+    observables, as `simulate` does.
+    '''
+    times = asarray(times, dtype = float)
+    observables = [asarray(observable) for observable in simulate(times)]
+    active = list(range(len(times) - 1)) # Intervals still to be checked, by their left extreme
+    priority = array([abs(o[1:] - o[:-1]) for o in observables]).max(axis = 0) if active else array([])
+
+    while active and len(times) < max_points:
+        if len(active) > max_points - len(times): # Largest expected errors first, in order of time
+            kept = sorted(argsort(-priority, kind = 'stable')[:max_points - len(times)])
+            active = [active[k] for k in kept]
+
+        midpoints = (times[active] + times[[i + 1 for i in active]]) / 2
+        new = [asarray(observable) for observable in simulate(midpoints)]
+
+        # Largest error of the linear interpolation of an observable at the midpoints
+        error = array([abs(n - (o[active] + o[[i + 1 for i in active]]) / 2) for n, o in zip(new, observables)]).max(axis = 0)
+        refined = error > tolerance
+
+        order = argsort(concatenate([times, midpoints]), kind = 'stable')
+        times = concatenate([times, midpoints])[order]
+        observables = [concatenate([o, n])[order] for o, n in zip(observables, new)]
+
+        # Both halves of the refined intervals, with the new indices, expected to be as bad
+        position = order.argsort()
+        new_left = position[len(times) - len(midpoints):][refined]
+        halves = sorted((i, e) for left, e in zip(new_left, error[refined]) for i in (left - 1, left))
+        active = [i for i, _ in halves]
+        priority = array([e for _, e in halves])
+
+    return times, tuple(observables)
+
+def maximal_power_search(simulate: object, times: list, tolerance: float = 1e-6) -> (float, float):
+    '''
+    Returns the maximal average power and the time at which it is reached, bracketing the maximum of
+    the internal energy divided by the time on the coarse grid of `times` and refining it with the
+    bounded Brent method, up to `tolerance` in time. With shot noise the refined maximum is only as
+    accurate as the simulated energies.
+    '''
+    times = asarray(times, dtype = float)
+    _, internal_energy, _ = simulate(times)
+    power, time = maximal_power(times, internal_energy)
+
+    positive = times[times > 0]
+    best = positive.searchsorted(time)
+    bounds = positive[max(best - 1, 0)], positive[min(best + 1, len(positive) - 1)]
+
+    if bounds[0] == bounds[1]: # A single positive time
+        return power, time
+
+    result = minimize_scalar(lambda t: - simulate(asarray([t]))[1][0] / t, bounds = bounds, method = 'bounded',
+                             options = {'xatol': tolerance})
+
+    if - result.fun < power: # The maximum is on the grid
+        return power, time
+
+    return - result.fun, result.x
@@ -0,0 +1,211 @@
+from itertools import combinations
+from numpy import arange, asarray, abs, cos, sin, exp, outer, real, sqrt, zeros
+from numpy.linalg import norm, eigh
+from numpy.random import default_rng
+from .counts_tools import probability_and_internal_energy, measure_coupling_energy, hamming_weight
+from .classical_tools import flip_mask, dicke_hamiltonian, eigenbasis_evolution
+
+######################################################################################################
+# PRODUCT FORMULAS ###################################################################################
+######################################################################################################
+
+# The Hamiltonian is split in the RZ layer, generated by the total spin along z, and in the RXX layer,
+# generated by the coupling, whose terms commute among each other. A product formula is a sequence of
+# layers, each evolving for a multiple of the time step.
+
+def suzuki_step(order: int) -> list:
+    '''
+    Returns the layers, as pairs of 'z' or 'xx' and of the fraction of the time step, of a single step
+    of the product formula of `order`: the first order Trotter one, the symmetric second order one or
+    the Suzuki recursion of even `order` built on it.
+    '''
+    if order == 1:
+        return [('z', 1.), ('xx', 1.)]
+
+    if order == 2:
+        return [('z', .5), ('xx', 1.), ('z', .5)]
+
+    if order < 1 or order % 2:
+        raise ValueError(f'Unsupported order {order}, expected 1 or an even number')
+
+    p = 1 / (4 - 4 ** (1 / (order - 1)))
+
+    return [(layer, fraction * scale) for scale in (p, p, 1 - 4 * p, p, p) for layer, fraction in suzuki_step(order - 2)]
+
+def trotter_layers(order: int, steps: int) -> list:
+    '''
+    Returns the layers of `steps` steps of the product formula of `order`, merging the consecutive
+    layers of the same kind, as the half RZ layers between the steps of the symmetric formulas.
+    '''
+    layers = []
+
+    for layer, fraction in suzuki_step(order) * steps:
+        if layers and layers[-1][0] == layer:
+            layers[-1] = (layer, layers[-1][1] + fraction)
+        else:
+            layers.append((layer, fraction))
+
+    return layers
+
+######################################################################################################
+# STATEVECTOR SIMULATION OF THE TROTTER CIRCUITS #####################################################
+######################################################################################################
+
+# The statevectors are stored as matrices with one row per time. The `k` element of the computational
+# basis has qubit `q` in the state `(k >> q) & 1`, so that `format(k, f'0{spins}b')` is the same
+# bit string returned by Qiskit, and qubit `q` is the two-level system `spins - 1 - q` of `flip_mask`.
+
+def rz_layer(states: list, spins: int, angles: list) -> list:
+    '''
+    Applies a RZ gate of angle `angles[i]` to all the qubits of the state in row `i` of `states`.
+    '''
+    total_spin = spins / 2 - hamming_weight(arange(2 ** spins), spins)
+
+    return states * exp(-1j * outer(angles, total_spin))
+
+def rxx_gate(states: list, spins: int, first: int, second: int, angles: list) -> list:
+    '''
+    Applies a RXX gate of angle `angles[i]` on the `first` and `second` qubits of the state in row
+    `i` of `states`.
+    '''
+    flipped = states[:, arange(2 ** spins) ^ flip_mask(spins, [spins - 1 - first, spins - 1 - second])]
+    angles = asarray(angles)[:, None] / 2
+
+    return cos(angles) * states - 1j * sin(angles) * flipped
+
+def hadamard_layer(states: list, spins: int) -> list:
+    '''
+    Applies a Hadamard gate to all the qubits of each row of `states`.
+    '''
+    states = states.copy()
+
+    for qubit in range(spins): # Splitting each state in the halves with the qubit in 0 and 1
+        pairs = states.reshape(len(states), -1, 2, 2 ** qubit)
+        zero, one = pairs[:, :, 0].copy(), pairs[:, :, 1].copy()
+        pairs[:, :, 0], pairs[:, :, 1] = (zero + one) / sqrt(2), (zero - one) / sqrt(2)
+
+    return states
+
+def trotter_statevectors(times: list, spins: int, trotter_steps: int, coupling: float, order: int = 1) -> list:
+    '''
+    Returns the matrix whose rows are the states prepared by `trotter_circuit` at each of the
+    `times`, applying the same sequence of gates to all the times together.
+    '''
+    time_steps = asarray(times, dtype = float) / trotter_steps
+    states = zeros((len(time_steps), 2 ** spins), dtype = complex)
+    states[:, -1] = 1 # All the qubits flipped
+
+    for layer, fraction in trotter_layers(order, trotter_steps):
+        angles = time_steps if fraction == 1 else time_steps * fraction
+
+        if layer == 'z':
+            states = rz_layer(states, spins, angles)
+            continue
+
+        for first, second in combinations(range(spins), 2):
+            states = rxx_gate(states, spins, first, second, - coupling * angles)
+
+    return states
+
+def trotter_observables(states: list, spins: int, coupling: float) -> (list, list, list):
+    '''
+    Returns the exact probability of all spins up, average internal energy and average coupling
+    energy of each row of `states`, normalized as in `quantum_simulator`.
+    '''
+    probabilities = abs(states) ** 2
+    total_spin = spins / 2 - hamming_weight(arange(2 ** spins), spins)
+    internal_energy = probabilities @ total_spin / spins + 1 / 2
+
+    # The sum of X_a X_b over the pairs is ((sum of X_a)^2 - n) / 2
+    sx_states = sum(states[:, arange(2 ** spins) ^ flip_mask(spins, [index])] for index in range(spins))
+    pairs = (real((sx_states.conjugate() * sx_states).sum(axis = 1)) - spins) / 2
+    coupling_energy = - coupling * pairs / spins / 2
+
+    return probabilities[:, 0], internal_energy, coupling_energy
+
+def sample_counts(states: list, spins: int, shots: int, seed: int = None) -> list:
+    '''
+    Measures `shots` times each row of `states` in the computational basis, returning the counts
+    with the same format of `Result.get_counts`.
+    '''
+    rng = default_rng(seed)
+    counts = []
+
+    for probabilities in abs(states) ** 2:
+        sampled = rng.multinomial(shots, probabilities / probabilities.sum())
+        counts.append({format(k, f'0{spins}b'): int(sampled[k]) for k in sampled.nonzero()[0]})
+
+    return counts
+
+def trotter_simulator(times: list, spins: int, trotter_steps: int, coupling: float, shots: int = None,
+                      our_mitigation: bool = False, seed: int = None, order: int = 1) -> (list, list, list):
+    '''
+    Ideal simulation of the same circuits of `quantum_simulator` without Qiskit. If `shots` is None
+    returns the exact observables of the trotterized states, otherwise measures them `shots` times
+    along z and x and computes the observables from the counts as `quantum_simulator` does.
+    '''
+    states = trotter_statevectors(times, spins, trotter_steps, coupling, order)
+
+    if shots is None:
+        return trotter_observables(states, spins, coupling)
+
+    rng = default_rng(seed)
+    first_counts = sample_counts(states, spins, shots, rng)
+    second_counts = sample_counts(hadamard_layer(states, spins), spins, shots, rng)
+
+    return *probability_and_internal_energy(times, first_counts, spins, shots, our_mitigation), \
+            measure_coupling_energy(times, second_counts, coupling, spins, shots)
+
+######################################################################################################
+# CHOICE OF THE NUMBER OF TROTTER STEPS ##############################################################
+######################################################################################################
+
+def exact_statevectors(times: list, spins: int, coupling: float) -> list:
+    '''
+    Returns the matrix whose rows are the exact evolutions at each of the `times` of the initial
+    state of `trotter_statevectors`, diagonalizing the `dicke_hamiltonian`. Its basis orders the
+    qubits the other way round, which does not change the evolved states as they are invariant under
+    permutations of the two-level systems.
+    '''
+    initial_state = zeros(2 ** spins)
+    initial_state[-1] = 1 # All the qubits flipped
+
+    return eigenbasis_evolution(times, *eigh(dicke_hamiltonian(spins, coupling)[2]), initial_state).T
+
+def trotter_error(times: list, spins: int, trotter_steps: int, coupling: float, order: int = 1, exact: list = None) -> float:
+    '''
+    Returns the maximal distance, over the `times`, between the trotterized and the exact states,
+    which bounds the error on the expectation value of an observable O by 2 |O| times it.
+    '''
+    exact = exact_statevectors(times, spins, coupling) if exact is None else exact
+
+    return norm(trotter_statevectors(times, spins, trotter_steps, coupling, order) - exact, axis = 1).max()
+
+def select_trotter_steps(times: list, spins: int, coupling: float, tolerance: float = 1e-2, order: int = 1,
+                         max_steps: int = 1024) -> int:
+    '''
+    Returns the smallest number of trotter steps whose states are within `tolerance` of the exact
+    ones at all the `times`, checked against the exact evolution by doubling the number of steps
+    and then bisecting, up to `max_steps`.
+    '''
+    exact = exact_statevectors(times, spins, coupling)
+    error = lambda steps: trotter_error(times, spins, steps, coupling, order, exact)
+    upper = 1
+
+    while error(upper) > tolerance:
+        if upper >= max_steps:
+            raise ValueError(f'More than {max_steps} trotter steps are needed to reach the tolerance {tolerance}')
+
+        upper = min(2 * upper, max_steps)
+
+    lower = upper // 2 # Too few steps, unless zero
+
+    while upper - lower > 1:
+        middle = (lower + upper) // 2
+
+        if error(middle) > tolerance:
+            lower = middle
+        else:
+            upper = middle
+
+    return upper